@@ -0,0 +1,158 @@
+import time
+import numpy as np
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio # Python 2
+    except ImportError:
+        asyncio = None
+try:
+    from concurrent.futures import ThreadPoolExecutor # futures on Python 2
+except ImportError:
+    ThreadPoolExecutor = None
+
+# histogram bucket upper edges
+LATENCYBUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, np.Inf]
+COUNTBUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, np.Inf]
+
+class Histogram(object):
+    """Counts of values in buckets (value <= edges[k])"""
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros((len(edges),), dtype=int)
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[np.searchsorted(self.edges, value)] += 1
+        self.total += value
+
+    def asdict(self):
+        n = self.counts.sum()
+        return {'edges': list(self.edges), 'counts': list(self.counts),
+                'count': n, 'mean': self.total / n if n > 0 else 0.0}
+
+
+class SolveStats(object):
+    """Queue depth and histograms of request latency (seconds), queue
+    depth at submit time and sweep sizes. Can be shared by Coalescers.
+    """
+    def __init__(self):
+        self.latency = Histogram(LATENCYBUCKETS)
+        self.depth = Histogram(COUNTBUCKETS)
+        self.batchsize = Histogram(COUNTBUCKETS)
+        self.queued = 0 # requests submitted and not answered yet
+        self.requests = 0
+        self.sweeps = 0
+
+    def asdict(self):
+        return {'queued': self.queued, 'requests': self.requests,
+                'sweeps': self.sweeps, 'latency': self.latency.asdict(),
+                'depth': self.depth.asdict(),
+                'batchsize': self.batchsize.asdict()}
+
+
+_executor = []
+
+def newExecutor(workers):
+    """bounded executor for backend calls"""
+    if ThreadPoolExecutor is None:
+        raise ImportError("async solves need concurrent.futures (package futures on Python 2)")
+    return ThreadPoolExecutor(workers)
+
+def executor(workers=4):
+    """executor shared by solvers (created on first use)"""
+    if not _executor:
+        _executor.append(newExecutor(workers))
+    return _executor[0]
+
+def solveMany(s, objs):
+    """solve with solver s for every objective in objs (k x numcols)
+    Solvers with solveBatch (IPMSolver, BatchLPSolver) solve all at once.
+    Return a list of solutions
+    """
+    if hasattr(s, 'solveBatch'):
+        r = s.solveBatch(obj=objs)
+        return [{'x': r['x'][k], 'objval': r['objval'][k],
+                 'status': r['status'][k], 'feasible': bool(r['feasible'][k]),
+                 'iterations': r['iterations'][k]}
+                for k in range(len(objs))]
+    solutions = []
+    for obj in objs:
+        solution = s.solve(obj)
+        if isinstance(solution, dict):
+            # the backend may reuse its arrays
+            solution = dict(solution)
+            solution['x'] = np.array(solution['x'], dtype=float)
+        # (a Solution keeps x when the solver solves again)
+        solutions.append(solution)
+    return solutions
+
+
+class Coalescer(object):
+    """Micro-batching of solve requests for one model
+
+    submit() returns an asyncio future. Requests that arrive within
+    window seconds of the first one, or while a sweep is running, are
+    solved together in one call sweep(objs) (objs is k x numcols) on
+    executor, at most maxbatch per sweep. Only one sweep runs at a
+    time, so a solver is never used by two threads. Each caller gets
+    its own solution.
+
+    Must be used from the thread running the event loop.
+    """
+    def __init__(self, sweep, executor, window=0.002, maxbatch=64, stats=None):
+        if asyncio is None:
+            raise ImportError("async solves need asyncio (package trollius on Python 2)")
+        self.sweep = sweep
+        self.executor = executor
+        self.window = window
+        self.maxbatch = maxbatch
+        self.stats = stats if stats is not None else SolveStats()
+        self.pending = [] # (obj, future, submit time)
+        self.running = False
+        self.timer = None
+
+    def submit(self, obj, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        future = asyncio.Future(loop=loop)
+        self.pending.append((np.asarray(obj, dtype=float), future, time.time()))
+        self.stats.queued += 1
+        self.stats.requests += 1
+        self.stats.depth.add(self.stats.queued)
+        if not self.running and self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush, loop)
+        return future
+
+    def _flush(self, loop):
+        self.timer = None
+        if self.running or not self.pending:
+            return
+        batch = self.pending[:self.maxbatch]
+        self.pending = self.pending[self.maxbatch:]
+        self.running = True
+        objs = np.array([obj for obj, future, t in batch])
+        done = asyncio.wrap_future(self.executor.submit(self.sweep, objs), loop=loop)
+        done.add_done_callback(lambda d: self._done(loop, batch, d))
+
+    def _done(self, loop, batch, done):
+        self.running = False
+        now = time.time()
+        error = done.exception()
+        solutions = done.result() if error is None else [None] * len(batch)
+        for (obj, future, t), solution in zip(batch, solutions):
+            self.stats.queued -= 1
+            self.stats.latency.add(now - t)
+            if future.cancelled():
+                continue
+            if error is None:
+                future.set_result(solution)
+            else:
+                future.set_exception(error)
+        self.stats.sweeps += 1
+        self.stats.batchsize.add(len(batch))
+        # requests queued during the sweep have waited long enough
+        if self.pending:
+            self._flush(loop)
@@ -0,0 +1,127 @@
+import os
+import numpy as np
+
+from solver import AT_LOWER, BASIC
+
+class BasisCache(object):
+    """Cache of simplex bases keyed by problem fingerprint
+
+    Used to warm-start new solver instances on problems that were
+    solved before (solvers store their basis with cacheBasis, or on
+    close). The key leaves out constraints and the objective,
+    so a basis is reused after rows are added or removed, or the
+    objective changes: it is mapped onto the rows shared with the
+    cached problem (see fitBasis).
+
+    If path is given, bases are also stored on disk (one .npz file per key)
+    """
+
+    def __init__(self, path=None, maxsize=100):
+        self.path = path
+        self.maxsize = maxsize
+        self.entries = {} # key -> (digests, cstat, rstat)
+        self.order = [] # keys, least recently used first
+        self.hits = 0
+        self.misses = 0
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, p):
+        return p.fingerprint(rows=False, obj=False)
+
+    def put(self, p, basis):
+        """store basis of problem p"""
+        key = self.key(p)
+        entry = (p.rowDigests(),
+                 np.asarray(basis['cstat'], dtype=np.int8),
+                 np.asarray(basis['rstat'], dtype=np.int8))
+        self._remember(key, entry)
+        if self.path is not None:
+            np.savez(self._fname(key), digests=entry[0],
+                     cstat=entry[1], rstat=entry[2])
+
+    def get(self, p):
+        """return a basis for problem p, or None"""
+        key = self.key(p)
+        entry = self.entries.get(key)
+        if entry is None and self.path is not None and os.path.exists(self._fname(key)):
+            f = np.load(self._fname(key))
+            try:
+                entry = (f['digests'], f['cstat'], f['rstat'])
+            finally:
+                f.close()
+            self._remember(key, entry)
+        elif entry is not None:
+            self.order.remove(key)
+            self.order.append(key)
+
+        basis = None
+        if entry is not None:
+            basis = fitBasis(entry, p.rowDigests())
+        if basis is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return basis
+
+    def clear(self):
+        self.entries = {}
+        self.order = []
+
+    def _remember(self, key, entry):
+        if key in self.entries:
+            self.order.remove(key)
+        self.entries[key] = entry
+        self.order.append(key)
+        while len(self.order) > self.maxsize:
+            del self.entries[self.order.pop(0)]
+
+    def _fname(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+
+def fitBasis(entry, digests):
+    """Map a cached basis onto a problem with row digests digests
+
+    Statuses are kept for the rows shared with the cached problem (the
+    longest common prefix), and slacks of the other rows become basic.
+    The number of basic variables is then fixed up to equal the number
+    of rows, so that the basis is valid for both GLPK and CPLEX.
+    Return None if no rows are shared.
+    """
+    olddigests, cstat, rstat = entry
+    numrows = len(digests)
+    n = min(numrows, len(olddigests))
+    diff = np.nonzero(olddigests[:n] != digests[:n])[0]
+    prefix = diff[0] if len(diff) > 0 else n
+    if prefix == 0 and numrows > 0 and len(olddigests) > 0:
+        return None
+
+    cstat = cstat.copy()
+    newrstat = np.empty((numrows,), dtype=np.int8)
+    newrstat[:prefix] = rstat[:prefix]
+    newrstat[prefix:] = BASIC
+
+    return fixBasis(cstat, newrstat, prefix)
+
+def fixBasis(cstat, rstat, first=0):
+    """Make the number of basic variables equal to the number of rows
+
+    If there are too many, slacks of rows first.. become non-basic first,
+    then the last basic columns. If there are too few, the last non-basic
+    slacks become basic. cstat and rstat are modified in place.
+    Return basis {'cstat', 'rstat'}
+    """
+    extra = (cstat == BASIC).sum() + (rstat == BASIC).sum() - len(rstat)
+    if extra > 0:
+        rows = np.nonzero(rstat[first:] == BASIC)[0][:extra] + first
+        rstat[rows] = AT_LOWER
+        extra -= len(rows)
+        if extra > 0:
+            cols = np.nonzero(cstat == BASIC)[0][-extra:]
+            cstat[cols] = AT_LOWER
+    elif extra < 0:
+        # e.g., removed rows had non-basic slacks
+        rows = np.nonzero(rstat != BASIC)[0][extra:]
+        rstat[rows] = BASIC
+    return {'cstat': cstat, 'rstat': rstat}
@@ -0,0 +1,71 @@
+import time
+import numpy as np
+
+from ipmsolver import IPMSolver
+
+class BatchLPSolver(IPMSolver):
+    """Solve many small LPs with the same constraints in one pass
+
+    The LPs share the constraint matrix of p, and can differ in
+    objectives, right-hand sides and bounds (see IPMSolver.solveBatch).
+    The interior point iteration runs on all of them at once, with
+    NumPy operations along the batch axis: the Newton systems of all
+    instances are stacked into one k x m x m (or augmented) array and
+    solved together. Meant for LPs with up to ~100 variables and rows,
+    where the per-call overhead of solve() dominates.
+    """
+    def __init__(self, p, name='batch lp solver', tol=1e-8, maxiter=100):
+        IPMSolver.__init__(self, p, name, tol=tol, maxiter=maxiter)
+        # dense matrices: small problems, stacked solves
+        self.options['sparse'] = False
+        self._build()
+
+    def _factor(self, dinv):
+        A, m, n = self.A, self.m, self.n
+        k = len(dinv)
+        reg = 1e-12
+        if self.free.any():
+            K = np.zeros((k, n + m, n + m))
+            K[:, np.arange(n), np.arange(n)] = -dinv
+            K[:, :n, n:] = A.T
+            K[:, n:, :n] = A
+            K[:, np.arange(n, n + m), np.arange(n, n + m)] = reg
+            def solve(r, rb):
+                d = np.linalg.solve(K, np.hstack([r, rb])[:, :, None])[:, :, 0]
+                return d[:, :n], d[:, n:]
+        else:
+            theta = 1 / dinv
+            M = np.matmul(A[None, :, :] * theta[:, None, :], A.T)
+            M[:, np.arange(m), np.arange(m)] += reg
+            def solve(r, rb):
+                dy = np.linalg.solve(M, (rb + (theta * r).dot(A.T))[:, :, None])[:, :, 0]
+                return theta * (dy.dot(A) - r), dy
+
+        def safesolve(r, rb):
+            try:
+                return solve(r, rb)
+            except np.linalg.LinAlgError:
+                # a singular system in the batch: solve one by one
+                return IPMSolver._factor(self, dinv)(r, rb)
+        return safesolve
+
+
+def compareBatch(p, solverclass, obj_batch):
+    """Solve LPs p with objectives obj_batch (k x numcols) one by one with
+    a solver of type solverclass, and in one batch with BatchLPSolver.
+    Report time and LPs per second of both
+    """
+    obj_batch = np.asarray(obj_batch, dtype=float)
+    k = len(obj_batch)
+    t = time.time()
+    s = solverclass(p.copy())
+    objval = np.array([s.solve(obj)['objval'] for obj in obj_batch])
+    t = time.time() - t
+    report = {'single': {'time': t, 'rate': k / max(t, 1e-9), 'objval': objval}}
+
+    t = time.time()
+    batch = BatchLPSolver(p.copy()).solveBatch(obj=obj_batch)
+    t = time.time() - t
+    report['batch'] = {'time': t, 'rate': k / max(t, 1e-9),
+                       'objval': batch['objval']}
+    return report
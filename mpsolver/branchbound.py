@@ -0,0 +1,237 @@
+import heapq
+import threading
+import time
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from solver import Solver
+
+class Node(object):
+    """Branch-and-bound node: variable bounds, bound on the objective
+    (of the parent relaxation) and a warm start basis
+    """
+    __slots__ = ['lb', 'ub', 'bound', 'depth', 'basis', 'var', 'up', 'frac']
+
+    def __init__(self, lb, ub, bound, depth, basis=None, var=None, up=None, frac=None):
+        self.lb, self.ub = lb, ub
+        self.bound, self.depth, self.basis = bound, depth, basis
+        # branching that created the node (for pseudo-costs)
+        self.var, self.up, self.frac = var, up, frac
+
+
+def evaluate(s, lb, ub, basis, obj=None):
+    """solve LP relaxation with solver s at bounds lb, ub (for objective
+    obj, default: the one of s.p)
+    Only bounds that differ from the current ones are changed
+    """
+    changed = np.nonzero((s.p.lb != lb) | (s.p.ub != ub))[0]
+    s.changeBounds(changed, lb[changed], ub[changed])
+    if basis is not None:
+        s.setBasis(basis)
+    solution = s.solve(obj)
+    result = {'feasible': solution['feasible'], 'objval': solution['objval'],
+              'x': np.asarray(solution['x'], dtype=float), 'basis': None}
+    if solution['feasible']:
+        result['basis'] = s.getBasis()
+    return result
+
+# solver of a worker process
+_worker = {}
+
+def _initworker(solverclass, q):
+    _worker['solver'] = solverclass(q, 'branch and bound worker')
+
+def _evaluateworker(args):
+    return evaluate(_worker['solver'], *args)
+
+
+class BranchAndBound(Solver):
+    """Branch-and-bound MILP solver on top of an LP solver
+
+    LP relaxations are solved by solvers of type solverclass, and nodes
+    are created by changing variable bounds (Solver.changeBounds). Each
+    node starts from the basis of its parent.
+
+    select is 'best' (best bound first) or 'depth' (depth first).
+    branch is 'fractional' (most fractional variable) or 'pseudocost'.
+    Up to workers open nodes are evaluated at a time, in a thread pool,
+    or in a process pool if processes=True (each worker process keeps
+    its own LP solver). timelimit is in seconds. callback, if given, is
+    called with a progress dictionary after every round of nodes.
+    Changes of p are picked up on the next solve (see sync).
+    """
+    def __init__(self, p, solverclass, name='branch and bound',
+                 select='best', branch='fractional', workers=1,
+                 processes=False, timelimit=None, callback=None, tol=1e-6):
+        Solver.__init__(self, p, name)
+        self.solverclass = solverclass
+        self.select = select
+        self.branch = branch
+        self.workers = workers
+        self.processes = processes
+        self.timelimit = timelimit
+        self.callback = callback
+        self.tol = tol
+        self.progress = []
+        self.s = None
+        self._relax()
+
+    def _relax(self):
+        """build the LP relaxation q of p and the root bounds"""
+        p, tol = self.p, self.tol
+        self.q = p.copy()
+        self.q.probtype = "LP"
+        self.q.ctype[:] = 'C'
+        ctype = np.asarray(p.ctype, '|S1')
+        self.integer = np.nonzero((ctype == 'I') | (ctype == 'B'))[0]
+        self.lb = np.asarray(p.lb, dtype=float).copy()
+        self.ub = np.asarray(p.ub, dtype=float).copy()
+        binary = ctype == 'B'
+        self.lb[binary] = np.maximum(self.lb[binary], 0)
+        self.ub[binary] = np.minimum(self.ub[binary], 1)
+        self.lb[self.integer] = np.ceil(self.lb[self.integer] - tol)
+        self.ub[self.integer] = np.floor(self.ub[self.integer] + tol)
+
+        # pseudo-costs: sum of objective degradation per unit and count
+        # (kept while the columns stay the same)
+        n = p.numcols
+        if getattr(self, 'pcsum', None) is None or self.pcsum.shape[1] != n:
+            self.pcsum = np.zeros((2, n))
+            self.pccount = np.zeros((2, n))
+
+    def sync(self):
+        """rebuild the relaxation if p changed since the last sync"""
+        if self.p.changes(self):
+            self._relax()
+            self.backendrows, self.backendcols = self.p.numrows, self.p.numcols
+
+    def _pool(self):
+        if self.workers <= 1:
+            solver = self.solverclass(self.q.copy(), self.name + ' lp')
+            return None, lambda args: [evaluate(solver, *a) for a in args]
+        if self.processes:
+            pool = Pool(self.workers, _initworker, (self.solverclass, self.q))
+            return pool, lambda args: pool.map(_evaluateworker, args)
+        local = threading.local()
+        def threadevaluate(a):
+            if not hasattr(local, 'solver'):
+                local.solver = self.solverclass(self.q.copy(), self.name + ' lp')
+            return evaluate(local.solver, *a)
+        pool = ThreadPool(self.workers)
+        return pool, lambda args: pool.map(threadevaluate, args)
+
+    def solve(self, obj=None):
+        """Find max obj over integer solutions
+        If obj is None, use the objective of p
+        """
+        self.sync()
+        if obj is not None:
+            obj = np.asarray(obj, dtype=float)
+        sign = 1.0 if self.p.maximize else -1.0
+        start = time.time()
+        pool, evaluateall = self._pool()
+
+        incumbent, incumbentx = -np.Inf, None
+        heap = []
+        counter = 0
+        self._push(heap, Node(self.lb, self.ub, np.Inf, 0), counter)
+        nodes = 0
+        status = 'opt'
+        try:
+            while heap:
+                if self.timelimit is not None and time.time() - start > self.timelimit:
+                    status = 'tmlim'
+                    break
+                batch = []
+                while heap and len(batch) < max(1, self.workers):
+                    node = heapq.heappop(heap)[-1]
+                    if node.bound > incumbent + self.tol:
+                        batch.append(node)
+                if not batch:
+                    break
+                results = evaluateall([(node.lb, node.ub, node.basis, obj) for node in batch])
+                nodes += len(batch)
+
+                for node, r in zip(batch, results):
+                    if not r['feasible']:
+                        continue
+                    value = sign * r['objval']
+                    self._updatePseudocost(node, value)
+                    if value <= incumbent + self.tol:
+                        continue
+                    x = r['x']
+                    frac = x[self.integer] - np.floor(x[self.integer])
+                    fractional = np.minimum(frac, 1 - frac) > self.tol
+                    if not fractional.any():
+                        incumbent, incumbentx = value, x
+                        continue
+                    j = self._branchvar(x, fractional)
+                    f = x[j] - np.floor(x[j])
+                    down = Node(node.lb, node.ub.copy(), value, node.depth + 1,
+                                r['basis'], j, False, f)
+                    down.ub[j] = np.floor(x[j])
+                    up = Node(node.lb.copy(), node.ub, value, node.depth + 1,
+                              r['basis'], j, True, f)
+                    up.lb[j] = np.ceil(x[j])
+                    for child in (down, up):
+                        counter += 1
+                        self._push(heap, child, counter)
+
+                bound = max([incumbent] + [h[-1].bound for h in heap])
+                info = {'time': time.time() - start, 'nodes': nodes,
+                        'open': len(heap), 'incumbent': sign * incumbent,
+                        'bound': sign * bound}
+                self.progress.append(info)
+                if self.callback is not None:
+                    self.callback(info)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if status == 'opt' and incumbentx is None:
+            status = 'nofeas'
+        bound = max([incumbent] + [h[-1].bound for h in heap])
+        self.s = {'x': incumbentx,
+                  'objval': sign * incumbent if incumbentx is not None else None,
+                  'status': status,
+                  'feasible': incumbentx is not None,
+                  'bound': sign * bound,
+                  'nodes': nodes}
+        return self.s
+
+    def solution(self):
+        return self.s
+
+    def _push(self, heap, node, counter):
+        if self.select == 'depth':
+            key = (-node.depth, -node.bound)
+        else:
+            key = (-node.bound, -node.depth)
+        heapq.heappush(heap, key + (counter, node))
+
+    def _branchvar(self, x, fractional):
+        """choose a branching variable among integer ones that are fractional"""
+        cand = self.integer[fractional]
+        f = x[cand] - np.floor(x[cand])
+        if self.branch == 'pseudocost':
+            count = self.pccount[:, cand]
+            if (count > 0).any():
+                avg = self.pcsum.sum() / max(1, self.pccount.sum())
+                pc = np.where(count > 0, self.pcsum[:, cand] / np.maximum(count, 1), avg)
+                score = np.maximum(pc[0] * f, 1e-6) * np.maximum(pc[1] * (1 - f), 1e-6)
+                return cand[np.argmax(score)]
+        elif self.branch != 'fractional':
+            raise ValueError("unknown branching rule %s" % (self.branch,))
+        return cand[np.argmax(np.minimum(f, 1 - f))]
+
+    def _updatePseudocost(self, node, value):
+        if node.var is None or np.isinf(node.bound):
+            return
+        if node.up:
+            d, dist = 1, 1 - node.frac
+        else:
+            d, dist = 0, node.frac
+        self.pcsum[d, node.var] += max(node.bound - value, 0) / max(dist, 1e-9)
+        self.pccount[d, node.var] += 1
@@ -5,6 +5,7 @@ from pycplex import cplexcodes as C
 from mpprob import MPProb
 
 from solver import Solver
+from basiscache import fixBasis
 
 OPTIMAL = [C.CPX_STAT_OPTIMAL, C.CPXMIP_OPTIMAL, C.CPXMIP_OPTIMAL_TOL]
 UNBOUNDED = [C.CPX_STAT_UNBOUNDED, C.CPXMIP_UNBOUNDED]
@@ -44,6 +45,7 @@ class CPLEXSolver(Solver):
                    s['matbeg'], s['matcnt'], s['matind'], s['matval'], 
                    self.lb, self.ub)
         CPX.copyctype(self.env, self.lp, p.ctype)
+        self.warmStart()
 
     def __del__(self):
         #print 'Deleting problem', self.name
@@ -56,6 +58,8 @@ class CPLEXSolver(Solver):
         CPX.copyctype(self.env, self.lp, np.asarray(ctype))
         
     def close(self):
+        if self.basisdirty:
+            self.cacheBasis()
         CPX.closeCPLEX(self.env)
         self.env = None
 
@@ -65,17 +69,56 @@ class CPLEXSolver(Solver):
         # change objective function
         CPX.chgobj(self.env, self.lp, self.nVars, self.indices, obj)
         
+    def _chgbds(self, indices):
+        """copy bounds of columns indices from MPProb to CPLEX in one call"""
+        lb = self.p.lb[indices]
+        lb[np.isinf(lb)] = -C.CPX_INFBOUND
+        ub = self.p.ub[indices]
+        ub[np.isinf(ub)] = C.CPX_INFBOUND
+        self.lb[indices] = lb
+        self.ub[indices] = ub
+        self._setbds(indices, lb, ub)
+
+    def _chgobj(self, indices):
+        """copy objective coefficients of columns indices from MPProb to CPLEX"""
+        CPX.chgobj(self.env, self.lp, len(indices), indices, self.p.obj[indices])
+
+    def _chgctype(self, indices):
+        """copy types of columns indices from MPProb to CPLEX"""
+        CPX.chgctype(self.env, self.lp, len(indices), indices, self.p.ctype[indices])
+
+    def _setbds(self, indices, lb, ub):
+        n = len(indices)
+        lu = np.array(['L']*n + ['U']*n)
+        CPX.chgbds(self.env, self.lp, 2*n, np.concatenate([indices, indices]),
+                   lu, np.concatenate([lb, ub]))
+
     def solve(self, obj=None):
         """Find max obj (obj is objective function)
         If obj is None, use existing obj function in CPLEX
+        With options['sensitivity'], the solution has duals, reduced costs
+        and ranging, and objectives within the ranging of the last solve
+        are answered without solving (see Solver.reuse)
         """
+        self.sync()
+        reused = self.reuse(obj)
+        if reused is not None:
+            return reused
+        self._release()
         if obj is not None:
             obj = np.asarray(obj, dtype=float)
             # change objective function
             CPX.chgobj(self.env, self.lp, self.nVars, self.indices, obj)
             
-        CPX.lpopt(self.env, self.lp)
+        if self.options.get('method') == 'dual':
+            # reoptimize from the current basis (see Solver.solveManyRHS)
+            CPX.dualopt(self.env, self.lp)
+        else:
+            CPX.lpopt(self.env, self.lp)
         solution = self.solution()
+        if solution['feasible']:
+            self.basisdirty = self.basiscache is not None
+        self._sensitivity(solution, obj)
         
         if obj is not None:
             # change objective function back
@@ -83,60 +126,129 @@ class CPLEXSolver(Solver):
         return solution
 
     def solution(self):
-        """get LP solution"""
-        #begin, end = 0, self.p.nVars-1 #inclusive index
-        s = {'x':None, 'objval':None, 'status':0, 'feasible':False}
+        """get LP solution
+        Row 'activity', 'dual' and 'reduced cost' are fetched from CPLEX
+        on first access (see solution.Solution)
+        """
         lpstat = CPX.getstat(self.env, self.lp)
-        s['x'] = CPX.getx(self.env, self.lp)
-        s['objval'] = CPX.getobjval(self.env, self.lp)
+        fetchers = {'activity': lambda: self._activity(s['x']),
+                    'dual': lambda: np.asarray(CPX.getpi(self.env, self.lp), dtype=float),
+                    'reduced cost': lambda: np.asarray(CPX.getdj(self.env, self.lp), dtype=float)}
+        s = self._newSolution(lpstat, CPX.getobjval(self.env, self.lp), lpstat in OPTIMAL,
+                              fetchers, ('activity',), x=CPX.getx(self.env, self.lp),
+                              iterations=CPX.getitcnt(self.env, self.lp))
         if lpstat in OPTIMAL:
             s['optimal'] = True
-            s['feasible'] = True
-        else:
-            pass
-            #print self.name, "Solution unbounded or infeasible. Code: ", lpstat
-        s['status'] = lpstat
         return s
     
+    def analyze(self, s, obj):
+        """add duals, reduced costs and objective and rhs ranging from CPLEX"""
+        n, m = self.p.numcols, self.p.numrows
+        s['dual'] = np.asarray(CPX.getpi(self.env, self.lp), dtype=float)
+        s['reduced cost'] = np.asarray(CPX.getdj(self.env, self.lp), dtype=float)
+        lower, upper = CPX.objsa(self.env, self.lp, 0, n-1)
+        s['obj lower'], s['obj upper'] = infinite(lower), infinite(upper)
+        if m > 0:
+            lower, upper = CPX.rhssa(self.env, self.lp, 0, m-1)
+            s['rhs lower'], s['rhs upper'] = infinite(lower), infinite(upper)
+        else:
+            s['rhs lower'] = s['rhs upper'] = np.zeros((0,))
+
+    def getBasis(self):
+        """return current basis as int8 status arrays {'cstat', 'rstat'}"""
+        self.sync()
+        return self._basis()
+
+    def _basis(self):
+        cstat, rstat = CPX.getbase(self.env, self.lp)
+        return {'cstat': np.asarray(cstat, dtype=np.int8),
+                'rstat': np.asarray(rstat, dtype=np.int8)}
+
+    def setBasis(self, basis):
+        """set basis from status arrays {'cstat', 'rstat'}"""
+        self.sync()
+        self._setbasis(basis)
+
+    def _setbasis(self, basis):
+        CPX.copybase(self.env, self.lp,
+                     np.asarray(basis['cstat'], dtype=np.int32),
+                     np.asarray(basis['rstat'], dtype=np.int32))
+
     def isFeasible(self, x):
         """Is point x feasible?"""
         x = np.asarray(x, dtype=float)
         assert(len(x) == self.nVars)
+        self.sync()
         # both lower and upper bound are set to x
         lu = np.array(['B']*self.p.numcols)
         CPX.chgbds(self.env, self.lp, self.nVars, self.indices, lu, x)      
+        # p does not change, so the ranging of the last solve would be reused
+        self.ranging = None
         feasible = self.solve()['feasible']
         # change bounds back
-        lu = np.array(['L']*self.p.numcols)
-        CPX.chgbds(self.env, self.lp, self.nVars, self.indices, lu, self.lb)      
-        lu = np.array(['U']*self.p.numcols)
-        CPX.chgbds(self.env, self.lp, self.nVars, self.indices, lu, self.ub)  
+        self._setbds(self.indices, self.lb, self.ub)
+        self.ranging = None
         return feasible
 
     def writeprob(self, fname=None):
         if fname is None:
             fname = self.name+'.LP'
+        self.sync()
         CPX.writeprob(self.env, self.lp, fname)
         
-    def addConstraint(self, c, update=True):
-        """add general constraint c
-        c is a dictionary with keys {'indices', 'coeffs', 'sense', 'rhs'}
+    def _addrows(self, first):
+        """add rows first.. of p with a single CPXaddrows"""
+        n = self.p.numrows - first
+        i, j, v = self.p.A.to_arrays()
+        b = np.searchsorted(i, first)
+        rmatbeg = (np.searchsorted(i, np.arange(first, first + n)) - b).astype(np.int32)
+        CPX.addrows(self.env, self.lp, 0, n, len(v) - b,
+                    self.p.rhs[first:], self.p.sense[first:],
+                    rmatbeg, j[b:], np.asarray(v[b:], dtype=float))
+
+    def _addcols(self, first):
+        """add columns first.. of p with a single CPXaddcols
+        CPLEX keeps the current basis: new columns enter as non-basic
         """
-        if update:
-            self.p.addConstraint(c)
-        else:
-            self.p.numrows += 1            
-
-        rhs = np.asarray([c['rhs']],dtype=float)
-        sense = np.asarray([c['sense']])
-        #rcnt = 1
-        CPX.newrows(self.env, self.lp, 1, rhs, sense)
-        for i,a in zip(c['indices'],c['coeffs']):
-            CPX.chgcoef(self.env, self.lp, self.p.numrows-1, i, a)
- 
-    def removeLastConstraint(self):
-        CPX.delrows(self.env, self.lp, self.p.numrows-1, self.p.numrows-1)
-        self.p.removeLastConstraint()
+        n = self.p.numcols - first
+        self.indices = np.arange(self.p.numcols, dtype=np.int32)
+        matbeg, matcnt, matind, matval = self._colarrays(first)
+
+        lb = self.p.lb[first:].copy()
+        lb[np.isinf(lb)] = -C.CPX_INFBOUND
+        ub = self.p.ub[first:].copy()
+        ub[np.isinf(ub)] = C.CPX_INFBOUND
+        self.lb = np.concatenate([self.lb, lb])
+        self.ub = np.concatenate([self.ub, ub])
+
+        CPX.addcols(self.env, self.lp, n, len(matind), self.p.obj[first:],
+                    matbeg, matind, matval, lb, ub)
+        if self.p.probtype in ("MILP", "MIQP"):
+            CPX.chgctype(self.env, self.lp, n, self.indices[first:],
+                         self.p.ctype[first:])
+
+    def _chgrhs(self, rows):
+        """copy rhs of rows from MPProb to CPLEX in one call"""
+        CPX.chgrhs(self.env, self.lp, len(rows), rows, self.p.rhs[rows])
+
+    def _delrows(self, rows):
+        """delete rows (sorted indices) with a single CPXdelsetrows,
+        keeping the basis of the remaining rows
+        """
+        basis = self._basis()
+        delstat = np.zeros((self.backendrows,), dtype=np.int32)
+        delstat[rows] = 1
+        CPX.delsetrows(self.env, self.lp, delstat)
+        self._setbasis(fixBasis(basis['cstat'], basis['rstat'][delstat == 0]))
+
+
+def infinite(a):
+    """CPLEX values beyond CPX_INFBOUND as infinities"""
+    a = np.asarray(a, dtype=float).copy()
+    a[a >= C.CPX_INFBOUND] = np.Inf
+    a[a <= -C.CPX_INFBOUND] = -np.Inf
+    return a
+
                    
 if __name__ == "__main__":
     A = [[1,2]]
@@ -0,0 +1,200 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from mpprob import MPProb, netChanges
+from solver import Solver
+
+def components(p):
+    """Find connected components of the variable-constraint graph of p
+
+    Variables are connected if they appear in the same row. Labels are
+    propagated between rows and columns with vectorized min-reductions
+    until they stop changing.
+    Return (collabel, rowlabel), component numbers 0..k-1 of every column
+    and row. Rows without coefficients go to component 0.
+    """
+    i, j, v = p.A.to_arrays()
+    collabel = np.arange(p.numcols)
+    while True:
+        rowlabel = np.empty((p.numrows,), dtype=collabel.dtype)
+        rowlabel[:] = p.numcols
+        np.minimum.at(rowlabel, i, collabel[j])
+        newlabel = collabel.copy()
+        np.minimum.at(newlabel, j, rowlabel[i])
+        # pointer jumping: follow labels to their roots
+        newlabel = newlabel[newlabel]
+        if (newlabel == collabel).all():
+            break
+        collabel = newlabel
+
+    roots, collabel = np.unique(collabel, return_inverse=True)
+    rowlabel = np.zeros((p.numrows,), dtype=collabel.dtype)
+    rowlabel[i] = collabel[j]
+    return collabel, rowlabel
+
+def _groups(label, k):
+    """Return list of index arrays of each group, and local index of every element"""
+    order = np.argsort(label, kind='mergesort')
+    counts = np.bincount(label, minlength=k)
+    starts = np.cumsum(counts) - counts
+    local = np.empty((len(label),), dtype=np.int32)
+    local[order] = np.arange(len(label)) - np.repeat(starts, counts)
+    return np.split(order, np.cumsum(counts)[:-1]), local
+
+def split(p):
+    """Split p into independent blocks
+
+    Columns that appear in no row are put together into one block.
+    Return a list of (rows, cols, block) where block is an MPProb over
+    columns cols and rows rows of p
+    """
+    collabel, rowlabel = components(p)
+    # merge columns without coefficients into one component
+    i, j, v = p.A.to_arrays()
+    empty = np.bincount(j, minlength=p.numcols) == 0
+    if empty.sum() > 1:
+        first = collabel[empty].min()
+        collabel[empty] = first
+        _, collabel = np.unique(collabel, return_inverse=True)
+        rowlabel = np.zeros((p.numrows,), dtype=collabel.dtype)
+        rowlabel[i] = collabel[j]
+    k = collabel.max() + 1
+
+    colgroups, collocal = _groups(collabel, k)
+    rowgroups, rowlocal = _groups(rowlabel, k)
+    entrygroups, _ = _groups(collabel[j], k)
+
+    blocks = []
+    for b in range(k):
+        rows, cols, e = rowgroups[b], colgroups[b], entrygroups[b]
+        q = MPProb(0, len(cols))
+        q.maximize = p.maximize
+        q.probtype = p.probtype
+        q.obj = np.asarray(p.obj, dtype=float)[cols]
+        q.lb = np.asarray(p.lb, dtype=float)[cols]
+        q.ub = np.asarray(p.ub, dtype=float)[cols]
+        q.ctype = np.asarray(p.ctype, '|S1')[cols]
+        q.numrows = len(rows)
+        q.A.init(len(rows), len(cols), len(e))
+        q.A.put(rowlocal[i[e]], collocal[j[e]], v[e])
+        q.rhs = np.asarray(p.rhs, dtype=float)[rows]
+        q.sense = np.asarray(p.sense, '|S1')[rows]
+        if p.rngval is not None:
+            q.rngval = np.asarray(p.rngval, dtype=float)[rows]
+        blocks.append((rows, cols, q))
+    return blocks
+
+
+def _locate(groups, n):
+    """group of every element 0..n-1 of index arrays groups, and its
+    position in the group
+    """
+    label = np.zeros((n,), dtype=np.int32)
+    local = np.zeros((n,), dtype=np.int32)
+    for b, g in enumerate(groups):
+        label[g] = b
+        local[g] = np.arange(len(g))
+    return label, local
+
+def _bylabel(label, indices):
+    """(group, indices in the group) for the groups of indices"""
+    for b in np.unique(label[indices]):
+        yield b, indices[label[indices] == b]
+
+def _solveblock(args):
+    solverclass, q, obj = args
+    s = solverclass(q, 'block')
+    return s.solve(obj)
+
+class DecomposedSolver(Solver):
+    """Solve a problem made of independent blocks block by block
+
+    p is split into blocks (connected components of the constraint
+    matrix), and each block gets its own solver of type solverclass.
+    Blocks are solved in parallel with workers threads, or processes if
+    processes=True. With processes, block solvers are built in the
+    worker processes on every solve, since solvers cannot be pickled.
+
+    Changes of rhs, bounds, objective and variable types of p go to the
+    blocks of their rows and columns. Rows or columns added or removed
+    may join or split blocks, so p is then split again (see sync).
+    """
+    def __init__(self, p, solverclass, name='decomposed solver',
+                 workers=4, processes=False):
+        Solver.__init__(self, p, name)
+        self.solverclass = solverclass
+        self.processes = processes
+        if processes:
+            self.workers = Pool(workers)
+        else:
+            self.workers = ThreadPool(workers)
+        self._build()
+
+    def _build(self):
+        """split p into blocks, with a solver per block (threads only)"""
+        self.blocks = split(self.p)
+        # block of every row and column, and its index in the block
+        self.rowblock, self.rowlocal = _locate([rows for rows, cols, q in self.blocks],
+                                               self.p.numrows)
+        self.colblock, self.collocal = _locate([cols for rows, cols, q in self.blocks],
+                                               self.p.numcols)
+        if self.processes:
+            self.solvers = None
+        else:
+            self.solvers = [self.solverclass(q, '%s block %d' % (self.name, b))
+                            for b, (rows, cols, q) in enumerate(self.blocks)]
+        self.backendrows, self.backendcols = self.p.numrows, self.p.numcols
+
+    def sync(self):
+        """apply the changes of p since the last sync to the blocks"""
+        records = self.p.changes(self)
+        if not records:
+            return
+        if [r for r in records if r[0] in ('rows', 'delete', 'cols')]:
+            self._build()
+            return
+        p = self.p
+        c = netChanges(records, p.numrows)
+        for b, rows in _bylabel(self.rowblock, c['rhs']):
+            self.blocks[b][2].changeRHS(self.rowlocal[rows], p.rhs[rows])
+        for b, cols in _bylabel(self.colblock, c['bounds']):
+            self.blocks[b][2].changeBounds(self.collocal[cols], p.lb[cols], p.ub[cols])
+        for b, cols in _bylabel(self.colblock, c['obj']):
+            self.blocks[b][2].changeObjective(p.obj[cols], self.collocal[cols])
+        for b, cols in _bylabel(self.colblock, c['ctype']):
+            self.blocks[b][2].changeVarType(p.ctype[cols], self.collocal[cols])
+
+    def close(self):
+        self.workers.close()
+        self.workers.join()
+
+    def solve(self, obj=None):
+        """Find max obj (obj is objective function)
+        If obj is None, use the objective of p
+        """
+        self.sync()
+        if obj is not None:
+            obj = np.asarray(obj, dtype=float)
+        def blockobj(cols):
+            if obj is None:
+                return None
+            return obj[cols]
+
+        if self.processes:
+            args = [(self.solverclass, q, blockobj(cols))
+                    for rows, cols, q in self.blocks]
+            solutions = self.workers.map(_solveblock, args)
+        else:
+            def solve(b):
+                return self.solvers[b].solve(blockobj(self.blocks[b][1]))
+            solutions = self.workers.map(solve, range(len(self.blocks)))
+
+        x = np.empty((self.p.numcols,))
+        for (rows, cols, q), s in zip(self.blocks, solutions):
+            x[cols] = s['x']
+        return {'x': x,
+                'objval': sum([s['objval'] for s in solutions]),
+                'status': [s['status'] for s in solutions],
+                'feasible': all([s['feasible'] for s in solutions]),
+                'blocks': solutions}
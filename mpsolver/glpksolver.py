@@ -1,9 +1,13 @@
 import numpy as np
 import glpk
 
-from solver import Solver
+from solver import Solver, AT_LOWER, BASIC, AT_UPPER, FREE
+from basiscache import fixBasis
 
 CTYPES = {'B':bool, 'C':float, 'I':int}
+# GLPK variable status <-> basis status codes
+STATUS = {'bs':BASIC, 'nl':AT_LOWER, 'nu':AT_UPPER, 'nf':FREE, 'ns':AT_LOWER}
+GLPKSTATUS = {BASIC:'bs', AT_LOWER:'nl', AT_UPPER:'nu', FREE:'nf'}
 glpk.env.term_on = False
 
 class GLPKSolver(Solver):
@@ -19,11 +23,7 @@ class GLPKSolver(Solver):
         self.lp.cols.add(self.p.numcols)
         self.lp.obj[:] = list(self.p.obj)
         for c, lb, ub, in zip(self.lp.cols, self.p.lb, self.p.ub):
-            if np.isinf(lb):
-                lb = None
-            if np.isinf(ub):
-                ub = None
-            c.bounds = lb, ub
+            c.bounds = glpkbounds(lb, ub)
 
         # set variable types
         self.changeVarType(self.p.ctype)
@@ -43,7 +43,8 @@ class GLPKSolver(Solver):
                 assert False, "wrong sense %s" % (self.p.sense[i],)
 
         # matrix coefficients
-        self.lp.matrix = self.p.A.to_coordinate()
+        self.lp.matrix = self.p.A.iter_coordinate()
+        self.warmStart()
 
 
     def __del__(self):
@@ -59,6 +60,28 @@ class GLPKSolver(Solver):
         # change objective function
         CPX.chgobj(self.env, self.lp, self.nVars, self.indices, obj)
 
+    def _chgbds(self, indices):
+        """copy bounds of columns indices from MPProb to GLPK"""
+        cols = self.lp.cols
+        for j in indices:
+            j = int(j)
+            cols[j].bounds = glpkbounds(self.p.lb[j], self.p.ub[j])
+
+    def _chgobj(self, indices):
+        """copy objective coefficients of columns indices from MPProb to GLPK"""
+        for j in indices:
+            self.lp.obj[int(j)] = float(self.p.obj[j])
+
+    def _chgctype(self, indices):
+        """copy types of columns indices from MPProb to GLPK"""
+        for j in indices:
+            self.lp.cols[int(j)].kind = CTYPES[self.p.ctype[j]]
+
+    def _backendBytes(self):
+        # every nonzero is linked into a row and a column list (GLPAIJ),
+        # plus a GLPROW/GLPCOL record per row and column
+        return 56 * self.p.A.nnz() + 120 * (self.p.numrows + self.p.numcols)
+
     def changeVarType(self, ctype):
         for c, ctype in zip(self.lp.cols, ctype):
             c.kind = CTYPES[ctype]
@@ -66,13 +89,24 @@ class GLPKSolver(Solver):
     def solve(self, obj=None):
         """Find max obj (obj is objective function)
         If obj is None, use existing obj function
+        With options['sensitivity'], the solution has duals, reduced costs
+        and ranging, and objectives within the ranging of the last solve
+        are answered without solving (see Solver.reuse)
         """
+        self.sync()
+        s = self.reuse(obj)
+        if s is not None:
+            return s
+        self._release()
         if obj is not None:
             tmpobj = self.lp.obj[:]
             self.lp.obj[:] = list(obj)
 
         #self.lp.cpx_basis()
-        if self.p.probtype == "LP":
+        if self.p.probtype == "LP" and self.options.get('method') == 'dual':
+            # reoptimize from the current basis (see Solver.solveManyRHS)
+            self.lp.simplex(meth=glpk.LPX.DUALP)
+        elif self.p.probtype == "LP":
             self.lp.simplex() # or self.lp.interior(), self.lp.exact
             #self.lp.exact() # or self.lp.interior(), self.lp.exact
         elif self.p.probtype == "MILP":
@@ -81,21 +115,57 @@ class GLPKSolver(Solver):
         else:
             raise Error("wrong problem type")
         s = self.solution()
+        if s['feasible']:
+            self.basisdirty = self.basiscache is not None
+        self._sensitivity(s, obj)
         # change objective function back
         if obj is not None:
             self.lp.obj[:] = tmpobj
         return s
 
     def solution(self):
-        """get LP solution"""
-        s = {'x': np.array([c.value for c in self.lp.cols]),
-             'x primal': [c.primal for c in self.lp.cols],
-             #'x dual': [c.dual for c in self.lp.cols],
-             'objval': self.lp.obj.value,
-             'status': self.lp.status,
-             'feasible': self.lp.status in ('feas', 'opt')}
-        return s
+        """get LP solution
+        x, 'x primal', row 'activity', 'dual' and 'reduced cost' are
+        fetched from GLPK on first access (see solution.Solution)
+        """
+        status = self.lp.status
+        fetchers = {'x': lambda: self._fetch('x', self.lp.cols, 'value'),
+                    'x primal': lambda: list(self._fetch('x primal', self.lp.cols, 'primal')),
+                    'activity': lambda: self._fetch('activity', self.lp.rows, 'primal'),
+                    'dual': lambda: self._fetch('dual', self.lp.rows, 'dual'),
+                    'reduced cost': lambda: self._fetch('reduced cost', self.lp.cols, 'dual')}
+        return self._newSolution(status, self.lp.obj.value, status in ('feas', 'opt'),
+                                 fetchers)
+
+    def _fetch(self, key, items, attr):
+        """attribute attr of GLPK rows or columns items, in buffer key"""
+        out = self._buffer(key, len(items))
+        out[:] = [getattr(item, attr) for item in items]
+        return out
+
+
+    def getBasis(self):
+        """return current basis as int8 status arrays {'cstat', 'rstat'}"""
+        self.sync()
+        return self._basis()
+
+    def _basis(self):
+        cstat = np.array([STATUS[c.status] for c in self.lp.cols], dtype=np.int8)
+        rstat = np.array([STATUS[r.status] for r in self.lp.rows], dtype=np.int8)
+        return {'cstat': cstat, 'rstat': rstat}
+
+    def setBasis(self, basis):
+        """set basis from status arrays {'cstat', 'rstat'}
+        GLPK replaces statuses invalid for the bounds of a variable
+        """
+        self.sync()
+        self._setbasis(basis)
 
+    def _setbasis(self, basis):
+        for c, st in zip(self.lp.cols, basis['cstat']):
+            c.status = GLPKSTATUS[st]
+        for r, st in zip(self.lp.rows, basis['rstat']):
+            r.status = GLPKSTATUS[st]
 
     def NOTIMPLEMENTEDisFeasible(self, x):
         """Is point x feasible?"""
@@ -115,42 +185,82 @@ class GLPKSolver(Solver):
     def writeprob(self, fname=None):
         if fname is None:
             fname = self.name+'.GLPK'
+        self.sync()
         self.lp.write(cpxlp=fname)
 
-    def addConstraint(self, c, update=True):
-        """add general constraint c
-        c is a dictionary with keys {'indices', 'coeffs', 'sense', 'rhs'}
-        """
-        if update:
-            self.p.addConstraint(c)
-        else:
-            self.p.numrows += 1            
-
-        self.lp.rows.add(1)
-        row = self.lp.rows[-1]
-        if c['sense'] == 'E':
-            row.bounds = c['rhs']
-        elif c['sense'] == 'L':
-            row.bounds = None, c['rhs']
-        elif c['sense'] == 'G':
-            row.bounds = c['rhs'], None
-        else:
-            assert False, "wrong sense"
-        # make sure indices are ints, not numpy.int64s
-        indices = [int(i) for i in c['indices']]
-        row.matrix = zip(indices, c['coeffs'])
-
+    def _addrows(self, first):
+        """add rows first.. of p in one block"""
+        n = self.p.numrows - first
+        i, j, v = self.p.A.to_arrays()
+        start = np.searchsorted(i, np.arange(first, first + n + 1))
+        self.lp.rows.add(n)
+        for k in xrange(n):
+            row = self.lp.rows[first + k]
+            row.bounds = rowbounds(self.p.sense[first + k], self.p.rhs[first + k])
+            b, e = start[k], start[k+1]
+            row.matrix = zip(j[b:e].tolist(), v[b:e].tolist())
         self.lp.cpx_basis()
 
-    def removeLastConstraint(self):
-        del self.lp.rows[-1:]
-        self.p.removeLastConstraint()
-        self.lp.cpx_basis()
+    def _addcols(self, first):
+        """add columns first.. of p as non-basic columns"""
+        n = self.p.numcols - first
+        matbeg, matcnt, matind, matval = self._colarrays(first)
 
-    def removeLastConstraints(self, n):
-        """remove n last constraints"""
-        del self.lp.rows[-n:]
-        self.p.removeLastConstraints(n)
-        self.lp.cpx_basis()
+        self.lp.cols.add(n)
+        for k in xrange(n):
+            j = first + k
+            c = self.lp.cols[j]
+            c.bounds = glpkbounds(self.p.lb[j], self.p.ub[j])
+            c.kind = CTYPES[self.p.ctype[j]]
+            b, e = matbeg[k], matbeg[k] + matcnt[k]
+            c.matrix = zip([int(i) for i in matind[b:e]], matval[b:e])
+            c.status = nonbasic(self.p.lb[j], self.p.ub[j])
+        self.lp.obj[first:] = list(self.p.obj[first:])
+
+    def _chgrhs(self, rows):
+        """copy rhs of rows from MPProb to GLPK"""
+        for r in rows:
+            r = int(r)
+            self.lp.rows[r].bounds = rowbounds(self.p.sense[r], self.p.rhs[r])
+
+    def _delrows(self, rows):
+        """delete rows (sorted indices) in one call, keeping the basis of
+        the remaining rows (repaired if deleted slacks were non-basic)
+        """
+        if len(rows) > 0:
+            basis = self._basis()
+            keep = np.ones((len(basis['rstat']),), dtype=bool)
+            keep[rows] = False
+            del self.lp.rows[tuple(rows.tolist())]
+            self._setbasis(fixBasis(basis['cstat'], basis['rstat'][keep]))
+
+
+def rowbounds(sense, rhs):
+    """GLPK bounds of a row with sense 'E', 'L' or 'G'"""
+    if sense == 'E':
+        return rhs
+    elif sense == 'L':
+        return None, rhs
+    elif sense == 'G':
+        return rhs, None
+    else:
+        assert False, "wrong sense"
 
+def glpkbounds(lb, ub):
+    """Convert bounds to GLPK format (None for infinite)"""
+    if np.isinf(lb):
+        lb = None
+    if np.isinf(ub):
+        ub = None
+    return lb, ub
 
+def nonbasic(lb, ub):
+    """GLPK status of a non-basic column with bounds [lb, ub]"""
+    if lb == ub:
+        return 'ns' # fixed
+    elif not np.isinf(lb):
+        return 'nl'
+    elif not np.isinf(ub):
+        return 'nu'
+    else:
+        return 'nf' # free
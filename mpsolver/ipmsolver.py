@@ -0,0 +1,398 @@
+import time
+import numpy as np
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+    SPARSE = True
+except ImportError:
+    SPARSE = False
+
+from solver import Solver, AT_LOWER, BASIC, AT_UPPER
+from basiscache import fixBasis
+from sparsematrix import storeformat, MemoryBudgetError
+
+class IPMSolver(Solver):
+    """Primal-dual interior point LP solver (Mehrotra predictor-corrector)
+
+    Pure NumPy, no backend. The problem is converted to the standard form
+        min c'x  s.t.  Ax = b,  0 <= x[~F],  x[U] <= u
+    (bounds are shifted, columns with only an upper bound are negated,
+    and rows get slack columns). Free columns F are kept free, and fixed
+    columns are kept at their value. Every
+    iteration solves the normal equations A Theta A' dy = r, or the
+    augmented system if there are free columns. These are factored with
+    scipy.sparse if it is installed, and dense otherwise.
+
+    If crossover is a solver class (e.g., GLPKSolver), the interior
+    solution is turned into a starting basis for that solver, which
+    then finds an optimal vertex.
+    """
+    def __init__(self, p, name='ipm solver', crossover=None,
+                 tol=1e-8, maxiter=100):
+        Solver.__init__(self, p, name)
+        self.crossover = crossover
+        self.tol = tol
+        self.maxiter = maxiter
+        self.regularization = 1e-12 # for free and fixed columns
+        self.options = {'sparse': SPARSE}
+        self.obj = None
+        self.s = None
+        self._build()
+
+    def _build(self):
+        """build the standard form structure of p
+        Only b and u depend on the rhs and bounds, so it is shared by
+        all instances in solveBatch
+        """
+        p = self.p
+        n = p.numcols
+        lb = np.asarray(p.lb, dtype=float)
+        ub = np.asarray(p.ub, dtype=float)
+        lower = ~np.isinf(lb)
+        upper = ~lower & ~np.isinf(ub)
+        free = ~lower & ~upper
+
+        # x = offset + sign * (standard column)
+        self.offset = np.where(lower, lb, np.where(upper, ub, 0.0))
+        self.sign = np.where(upper, -1.0, 1.0)
+        nx = n
+
+        sense = np.asarray(p.sense, '|S1')
+        for s in np.unique(sense):
+            if s not in ('L', 'G', 'E', 'R'):
+                raise ValueError("wrong sense %s" % (s,))
+        slackrows = np.nonzero(sense != 'E')[0]
+        slacksign = np.where(sense[slackrows] == 'L', 1.0, -1.0)
+        self.nx = nx
+        self.n = nx + len(slackrows)
+        self.slackrows = slackrows
+        noslack = np.zeros((len(slackrows),), dtype=bool)
+        self.free = np.concatenate([free, noslack])
+        fixed = lower & (ub == lb)
+        self.fixed = np.concatenate([fixed, noslack])
+
+        # upper bounds: bounded columns and range rows
+        self.lower, self.upper = lower, upper
+        self.both = lower & ~np.isinf(ub) & ~fixed
+        ranges = sense[slackrows] == 'R'
+        self.U = np.concatenate([np.nonzero(self.both)[0], nx + np.nonzero(ranges)[0]])
+        self.urange = self._rngval()[slackrows][ranges]
+        self.u = self._upper(lb, ub)
+
+        # constraint matrix in coordinate form
+        i, j, v = p.A.to_arrays()
+        self.Aorig = (i, j, v)
+        self.i = np.concatenate([i, slackrows])
+        self.j = np.concatenate([j, nx + np.arange(len(slackrows))])
+        self.v = np.concatenate([v * self.sign[j], slacksign])
+        self.m = p.numrows
+        if self.options['sparse']:
+            self.A = scipy.sparse.csr_matrix((self.v, (self.i, self.j)),
+                                             shape=(self.m, self.n))
+        else:
+            if storeformat(self.m, self.n, 'numpy') != 'numpy':
+                raise MemoryBudgetError("dense %d x %d matrix is over the memory budget"
+                                        % (self.m, self.n))
+            self.A = np.zeros((self.m, self.n))
+            np.add.at(self.A, (self.i, self.j), self.v)
+
+    def _backendBytes(self):
+        # standard form arrays and matrix (factorizations are not counted)
+        nbytes = sum([a.nbytes for a in self.__dict__.values()
+                      if isinstance(a, np.ndarray)])
+        if self.options['sparse']:
+            nbytes += self.A.data.nbytes + self.A.indices.nbytes + self.A.indptr.nbytes
+        return nbytes
+
+    def _upper(self, lb, ub):
+        """upper bounds u of the standard form (one row per instance if 2-D)"""
+        both = self.both
+        if np.ndim(lb) == 2:
+            return np.hstack([(ub - lb)[:, both],
+                              np.tile(self.urange, (len(lb), 1))])
+        return np.concatenate([(ub - lb)[both], self.urange])
+
+    def _offset(self, lb, ub):
+        return np.where(self.lower, lb, np.where(self.upper, ub, 0.0))
+
+    def _rngval(self):
+        if self.p.rngval is None:
+            return np.zeros((self.p.numrows,))
+        return np.asarray(self.p.rngval, dtype=float)
+
+    def _stdobj(self, obj):
+        """objective of the standard form, one row per instance"""
+        obj = np.atleast_2d(obj)
+        c = np.zeros((len(obj), self.n))
+        c[:, :self.nx] = obj * self.sign
+        if self.p.maximize:
+            c = -c
+        return c
+
+    def _stdrhs(self, rhs, offset):
+        """rhs b of the standard form, one row per instance"""
+        i, j, v = self.Aorig
+        offset = np.atleast_2d(offset)
+        Ax0 = np.zeros((self.m, len(offset)))
+        np.add.at(Ax0, i, (v * offset[:, j]).T)
+        return np.atleast_2d(rhs) - Ax0.T
+
+    def solve(self, obj=None):
+        """Find max obj (obj is objective function)
+        If obj is None, use the objective of p
+        """
+        self.sync()
+        if obj is None:
+            obj = self.p.obj
+        self._release()
+        self.obj = np.asarray(obj, dtype=float)
+        c = self._stdobj(self.obj)
+        b = self._stdrhs(self.p.rhs, self.offset)
+        x, y, status, iterations = self.ipm(c, b)
+        self.s = self._solution(x[0], y[0], status[0], iterations[0])
+        if self.crossover is not None and self.s['feasible']:
+            self.s = self.cross(self.s)
+        return self.s
+
+    def solveBatch(self, rhs_batch=None, obj=None, lb=None, ub=None):
+        """solve a batch of k problems that differ from p only in
+        right-hand sides (k x numrows array rhs_batch), objectives
+        (obj, 1-D or k x numcols) and bounds (lb, ub, k x numcols, with
+        the same infinite and fixed bounds as p). All instances are solved
+        together.
+        Return stacked x (k x numcols), objval, status and iterations
+        arrays, the time taken and the rate in LPs per second
+        """
+        t = time.time()
+        self.sync()
+        arrays = [a for a in (rhs_batch, obj, lb, ub) if np.ndim(a) == 2]
+        k = len(arrays[0]) if arrays else 1
+        def batch(a, default):
+            if a is None:
+                a = default
+            a = np.asarray(a, dtype=float)
+            if np.ndim(a) == 1:
+                a = np.tile(a, (k, 1))
+            return a
+        obj = batch(obj, self.p.obj)
+        lb = batch(lb, self.p.lb)
+        ub = batch(ub, self.p.ub)
+        if ((np.isinf(lb) != np.isinf(self.p.lb)).any() or
+            (np.isinf(ub) != np.isinf(self.p.ub)).any() or
+            ((lb == ub) != (self.p.lb == self.p.ub)).any()):
+            raise ValueError("bounds must be infinite and fixed where bounds of p are")
+        offset = self._offset(lb, ub)
+
+        c = self._stdobj(obj)
+        b = self._stdrhs(batch(rhs_batch, self.p.rhs), offset)
+        xs, y, status, iterations = self.ipm(c, b, self._upper(lb, ub))
+        x = offset + self.sign * xs[:, :self.nx]
+        t = time.time() - t
+        return {'x': x, 'objval': (obj * x).sum(1),
+                'status': status, 'feasible': status == 'opt',
+                'iterations': iterations,
+                'time': t, 'rate': k / max(t, 1e-9)}
+
+    def solution(self):
+        return self.s
+
+    def _solution(self, xs, y, status, iterations):
+        x = self.offset + self.sign * xs[:self.nx]
+        if self.p.maximize:
+            y = -y
+        return self._newSolution(status, np.dot(self.obj, x), status == 'opt',
+                                 {'activity': lambda: self._activity(x)}, ('activity',),
+                                 x=x, y=y, iterations=iterations)
+
+    def ipm(self, c, b, u=None):
+        """Mehrotra predictor-corrector on min c'x, Ax = b, 0 <= x[~F], x[U] <= u
+        for a batch of instances: c, b and u have one row per instance.
+        Instances that converge drop out of the iteration.
+        Return (x, y, status, iterations), one row (entry) per instance
+        """
+        A, U, F, X, tol = self.A, self.U, self.free, self.fixed, self.tol
+        P = ~F & ~X
+        k, m, n = len(c), self.m, self.n
+        if u is None:
+            u = np.tile(self.u, (k, 1))
+        x = np.tile(np.where(P, 1.0, 0.0), (k, 1))
+        x[:, U] = np.minimum(1.0, u / 2)
+        w = u - x[:, U]
+        z = np.tile(np.where(P, 1.0, 0.0), (k, 1))
+        s = np.ones((k, len(U)))
+        y = np.zeros((k, m))
+        N = max(1, P.sum() + len(U))
+        bnorm = 1 + np.sqrt((b * b).sum(1))
+        cnorm = 1 + np.sqrt((c * c).sum(1))
+        norm = lambda r: np.sqrt((r * r).sum(1))
+
+        status = np.empty((k,), dtype='|S6')
+        status[:] = 'undef'
+        iterations = np.zeros((k,), dtype=int)
+        active = np.ones((k,), dtype=bool)
+        for it in range(self.maxiter):
+            rb = b - A.dot(x.T).T
+            rc = c - A.T.dot(y.T).T - z
+            rc[:, U] += s
+            rc[:, X] = 0.0 # fixed columns stay at 0
+            ru = u - x[:, U] - w
+            mu = ((x * z).sum(1) + (w * s).sum(1)) / N
+            cx = (c * x).sum(1)
+            opt = ((norm(rb) / bnorm < tol) & (norm(rc) / cnorm < tol) &
+                   (norm(ru) / bnorm < tol) & (mu * N / (1 + abs(cx)) < tol))
+            unbnd = ~opt & (np.abs(x).max(1) > 1e12)
+            nofeas = ~opt & ~unbnd & (np.abs(y).max(1) > 1e12)
+            status[active & opt] = 'opt'
+            status[active & unbnd] = 'unbnd'
+            status[active & nofeas] = 'nofeas'
+            active &= ~(opt | unbnd | nofeas)
+            if not active.any():
+                break
+            iterations[active] += 1
+
+            a = np.nonzero(active)[0]
+            xa, wa, ya, za, sa = x[a], w[a], y[a], z[a], s[a]
+            rb, rc, ru, mu = rb[a], rc[a], ru[a], mu[a]
+            xp = np.where(P, xa, 1.0)
+            dinv = np.where(P, za / xp, np.where(F, self.regularization,
+                                                 1 / self.regularization))
+            dinv[:, U] += sa / wa
+            solve = self._factor(dinv)
+
+            def direction(rxz, rws):
+                rxz[:, ~P] = 0.0
+                r = rc - rxz / xp
+                r[:, U] += (rws - sa * ru) / wa
+                dx, dy = solve(r, rb)
+                dx[:, X] = 0.0
+                dz = np.where(P, (rxz - za * dx) / xp, 0.0)
+                dw = ru - dx[:, U]
+                ds = (rws - sa * dw) / wa
+                return dx, dy, dz, dw, ds
+
+            def steps(dx, dz, dw, ds):
+                return (np.minimum(_step(xa[:, P], dx[:, P]), _step(wa, dw))[:, None],
+                        np.minimum(_step(za[:, P], dz[:, P]), _step(sa, ds))[:, None])
+
+            # predictor (affine scaling direction)
+            dx, dy, dz, dw, ds = direction(-xa * za, -wa * sa)
+            ap, ad = steps(dx, dz, dw, ds)
+            muaff = (((xa + ap * dx) * (za + ad * dz)).sum(1) +
+                     ((wa + ap * dw) * (sa + ad * ds)).sum(1)) / N
+            smu = ((muaff / mu) ** 3 * mu)[:, None]
+
+            # corrector
+            dx, dy, dz, dw, ds = direction(-xa * za - dx * dz + smu,
+                                           -wa * sa - dw * ds + smu)
+            ap, ad = steps(dx, dz, dw, ds)
+            ap, ad = np.minimum(1.0, 0.99 * ap), np.minimum(1.0, 0.99 * ad)
+            x[a] = xa + ap * dx
+            w[a] = wa + ap * dw
+            y[a] = ya + ad * dy
+            z[a] = za + ad * dz
+            s[a] = sa + ad * ds
+        return x, y, status, iterations
+
+    def _factor(self, dinv):
+        """factor the Newton systems of a batch (one row of dinv per instance)
+        Return a function solving them for (dx, dy), one row per instance
+        """
+        solvers = [self._factor1(d) for d in dinv]
+        def solve(r, rb):
+            d = [f(r[q], rb[q]) for q, f in enumerate(solvers)]
+            return np.array([dx for dx, dy in d]), np.array([dy for dx, dy in d])
+        return solve
+
+    def _factor1(self, dinv):
+        """factor the Newton system for diagonal dinv = Theta^-1
+        Return a function solving -Theta^-1 dx + A'dy = r, A dx = rb
+        for (dx, dy). Normal equations A Theta A' dy = rb + A Theta r are
+        used if there are no free columns, and the augmented system otherwise
+        """
+        A, m, n = self.A, self.m, self.n
+        reg = 1e-12 # keeps the systems nonsingular
+        if self.free.any():
+            if self.options['sparse']:
+                K = scipy.sparse.bmat([[scipy.sparse.diags(-dinv), A.T],
+                                       [A, reg * scipy.sparse.identity(m)]])
+                solveK = _sparsefactor(K)
+            else:
+                K = np.zeros((n + m, n + m))
+                K[:n, :n] = np.diag(-dinv)
+                K[:n, n:] = A.T
+                K[n:, :n] = A
+                K[n:, n:] = reg * np.eye(m)
+                solveK = lambda r: np.linalg.solve(K, r)
+            def solve(r, rb):
+                d = solveK(np.concatenate([r, rb]))
+                return d[:n], d[n:]
+            return solve
+
+        theta = 1 / dinv
+        if self.options['sparse']:
+            M = A.dot(scipy.sparse.diags(theta)).dot(A.T) + \
+                reg * scipy.sparse.identity(m)
+            solveM = _sparsefactor(M)
+        else:
+            M = np.dot(A * theta, A.T)
+            M[np.diag_indices(m)] += reg
+            try:
+                L = np.linalg.cholesky(M)
+                solveM = lambda r: np.linalg.solve(L.T, np.linalg.solve(L, r))
+            except np.linalg.LinAlgError:
+                solveM = lambda r: np.linalg.lstsq(M, r, rcond=None)[0]
+        def solve(r, rb):
+            dy = solveM(rb + A.dot(theta * r))
+            return theta * (A.T.dot(dy) - r), dy
+        return solve
+
+    def cross(self, s):
+        """crossover: start the simplex solver from a basis guessed from s"""
+        p = self.p
+        x = s['x']
+        tol = 1e-7
+        lb = np.asarray(p.lb, dtype=float)
+        ub = np.asarray(p.ub, dtype=float)
+        cstat = np.empty((p.numcols,), dtype=np.int8)
+        cstat[:] = BASIC
+        cstat[np.abs(x - ub) <= tol * (1 + np.abs(ub))] = AT_UPPER
+        cstat[np.abs(x - lb) <= tol * (1 + np.abs(lb))] = AT_LOWER
+        i, j, v = self.Aorig
+        activity = np.bincount(i, weights=v * x[j], minlength=self.m)
+        rhs = np.asarray(p.rhs, dtype=float)
+        rstat = np.empty((p.numrows,), dtype=np.int8)
+        rstat[:] = AT_LOWER
+        rstat[np.abs(activity - rhs) > tol * (1 + np.abs(rhs))] = BASIC
+
+        solver = self.crossover(p.copy(), self.name + ' crossover')
+        solver.setBasis(fixBasis(cstat, rstat))
+        cs = solver.solve(self.obj)
+        cs['ipm iterations'] = s['iterations']
+        return cs
+
+    def sync(self):
+        """rebuild once for all changes of p since the last sync"""
+        if self.p.changes(self):
+            self.backendrows = self.p.numrows
+            self.backendcols = self.nVars = self.p.numcols
+            self._build()
+
+
+def _sparsefactor(M):
+    """return a function solving M d = r
+    Falls back to dense least squares if M is singular (e.g., with
+    linearly dependent rows)
+    """
+    try:
+        return scipy.sparse.linalg.factorized(M.tocsc())
+    except RuntimeError:
+        M = M.toarray()
+        return lambda r: np.linalg.lstsq(M, r, rcond=None)[0]
+
+def _step(x, dx):
+    """largest steps a <= 1 with x + a*dx >= 0, for every row"""
+    if x.shape[1] == 0:
+        return np.ones((len(x),))
+    neg = dx < 0
+    ratio = np.where(neg, -x / np.where(neg, dx, -1.0), 1.0)
+    return np.minimum(1.0, ratio.min(1))
@@ -18,13 +18,27 @@
 ## ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR 
 ## OTHER DEALINGS IN THE SOFTWARE.
 
+import hashlib
+import itertools
+import time
+import weakref
 import numpy as np
 
-from sparsematrix import Matrix
+from sparsematrix import Matrix, column_arrays
+from rowindex import RowIndex
 
 class MPProb(object):
     """Mathematical Programming problem
     By default, maximize=True, and obj is all zeros
+
+    Rows added with addConstraint are kept pending, and appended to A,
+    rhs and sense in one block when one of them is read. Blocks of rows
+    appended to rhs and sense are joined when those are read.
+
+    Changes (rows added or removed, rhs, bounds, objective and variable
+    types) are recorded in an append-only journal for the solvers of the
+    problem, which apply them to their backend (see subscribe, changes
+    and Solver.sync).
     """
 
     def __init__(self, numrows, numcols):
@@ -36,6 +50,11 @@ class MPProb(object):
 
         assert numcols > 0
         assert numrows >= 0
+        self.__dict__['pending'] = [] # rows added and not in A yet
+        self.__dict__['appended'] = [] # (rhs, sense) blocks not in rhs, sense yet
+        self.journal = [] # change records, see changes
+        self.journalstart = 0 # position of journal[0] among all records
+        self.readers = weakref.WeakKeyDictionary() # reader -> position
         self.numcols = numcols
         self.numrows = numrows
         self.probtype = "LP" # (LP, QP, MILP, MIQP)
@@ -55,13 +74,72 @@ class MPProb(object):
         self.sense = np.empty((numrows,),'|S1')
         self.sense[:] = 'E' # set by default
         self.rngval = None # or np.zeros((numrows,))
+        self.rowindex = None # see indexRows
 
     def __setattr__(self, name, value):
         if name == 'A':
             raise AttributeError("Use setA() to update the matrix A")
         else:
+            if name in ('rhs', 'sense'):
+                self._flush()
+                self._join()
             self.__dict__[name] = value
 
+    # A, rhs and sense include pending rows
+    A = property(lambda self: self._get('A'))
+    rhs = property(lambda self: self._get('rhs'))
+    sense = property(lambda self: self._get('sense'))
+
+    def _get(self, name):
+        self._flush()
+        if name != 'A':
+            self._join()
+        return self.__dict__[name]
+
+    def __getstate__(self):
+        self._flush()
+        self._join()
+        state = dict(self.__dict__)
+        del state['readers']
+        state['journal'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__['appended'] = []
+        self.__dict__.update(state)
+        self.__dict__['readers'] = weakref.WeakKeyDictionary()
+
+    def subscribe(self, reader):
+        """start recording changes for reader (e.g., a solver)"""
+        self.readers[reader] = self.journalstart + len(self.journal)
+
+    def changes(self, reader):
+        """Return the change records since the last call for reader:
+            ('rows', first, n)   rows first..first+n-1 added
+            ('delete', rows)     rows removed (sorted indices before removal)
+            ('cols', first, n)   columns first..first+n-1 added
+            ('rhs', rows)        rhs of rows changed
+            ('bounds', indices)  bounds of variables changed
+            ('obj', indices)     objective coefficients changed
+            ('ctype', indices)   variable types changed
+        Records no reader needs anymore are dropped
+        """
+        k = self.readers[reader] - self.journalstart
+        records = self.journal[k:]
+        self.readers[reader] = self.journalstart + len(self.journal)
+        first = min(self.readers.values()) - self.journalstart
+        if first > 0:
+            del self.journal[:first]
+            self.journalstart += first
+        return records
+
+    def _log(self, *record):
+        if len(self.readers) > 0:
+            self.journal.append(record)
+        else:
+            self.journalstart += len(self.journal)
+            self.journal = []
+
     def setA(self, A, format='matrix', params=None):
         """Set constraints matrix A"""
         if format == 'matrix':
@@ -74,15 +152,15 @@ class MPProb(object):
             assert(self.numcols == numcols)
             self.numrows = numrows
             self.A.init(numrows, numcols, nnz)
-            for k in range(nnz):
-                self.A[int(i[k]),int(j[k])] = v[k]
+            self.A.put(i, j, v)
 
         if format == 'coord':
             assert(self.numcols == params['m'])
             self.numrows = params['n']
             self.A.init(self.numrows, self.numcols, len(A))
-            for i,j,v in A:
-                self.A[int(i),int(j)] = v
+            if len(A) > 0:
+                i, j, v = zip(*A)
+                self.A.put(np.asarray(i, dtype=int), np.asarray(j, dtype=int), v)
 
     def setQ(self, Q):
         """Set quadratic objective matrix Q"""
@@ -91,18 +169,34 @@ class MPProb(object):
     def setRHS(self,rhs):
         """Set rhs vector rhs"""
         self.rhs = np.asarray(rhs, dtype=float)
+        if self.rowindex is not None and len(self.rhs) == len(self.rowindex.norm):
+            self.rowindex.changeRHS(xrange(len(self.rhs)), self.rhs)
 
     def setSense(self,sense):
         """Set sense vector sense"""
         self.sense = np.asarray(sense, '|S1')
 
     def addConstraint(self, c):
-        # c = {'indices', 'coeffs', 'sense', 'rhs'}
+        """Add constraint c = {'indices', 'coeffs', 'sense', 'rhs'}
+        Return the row that holds it: the new row, or with a row index,
+        the row it duplicates or was merged into (see indexRows)
+        """
         assert(len(c['indices']) == len(c['coeffs']))
-        Arow = np.zeros((1,self.numcols))
-        for i,a in zip(c['indices'],c['coeffs']):
-            Arow[0,i] = a
-        self.addConstraintRows((Arow, [c['rhs']], [c['sense']]))
+        if self.rowindex is None:
+            # pending until A, rhs or sense is read (copied, callers may
+            # reuse their buffers)
+            self.pending.append((np.array(c['indices'], dtype=np.int32),
+                                 np.array(c['coeffs'], dtype=float),
+                                 c['sense'], c['rhs']))
+            self.numrows += 1
+            self._log('rows', self.numrows - 1, 1)
+            return self.numrows - 1
+        n = len(c['indices'])
+        rows = self.addSparseRows(np.zeros((n,), dtype=np.int32),
+                                  np.asarray(c['indices'], dtype=np.int32),
+                                  np.asarray(c['coeffs'], dtype=float),
+                                  [c['sense']], [c['rhs']])
+        return int(rows[0])
         
     def addComparisonConstraint(self, c):
         # c = {'index1', 'sense', 'index2'}
@@ -118,21 +212,323 @@ class MPProb(object):
         Arow[0, c['index']] = 1
         self.addConstraintRows((Arow, [c['val']], [c['sense']]))
 
+    def addComparisonConstraints(self, index1, index2, sense):
+        """Add constraints var[index1[k]] sense[k] var[index2[k]] in one block
+        index1, index2 are arrays, sense is an array or a single sense.
+        Pairs with index1 == index2 are skipped
+        """
+        index1 = np.asarray(index1, dtype=np.int32).ravel()
+        index2 = np.asarray(index2, dtype=np.int32).ravel()
+        sense = _senses(sense, len(index1))
+        keep = index1 != index2
+        index1, index2, sense = index1[keep], index2[keep], sense[keep]
+        n = len(index1)
+        return self.addSparseRows(np.repeat(np.arange(n), 2),
+                           np.column_stack([index1, index2]).ravel(),
+                           np.tile([1.0, -1.0], n), sense, np.zeros((n,)))
+
+    def addBoundConstraints(self, index, sense, val, asbounds=False):
+        """Add constraints var[index[k]] sense[k] val[k] in one block
+        sense and val are arrays or single values.
+        With asbounds=True, the bounds of the variables are tightened
+        instead, and no rows are added
+        """
+        index = np.asarray(index, dtype=np.int32).ravel()
+        sense = _senses(sense, len(index))
+        val = np.zeros((len(index),)) + np.asarray(val, dtype=float)
+        if asbounds:
+            lower = (sense == 'G') | (sense == 'E')
+            upper = (sense == 'L') | (sense == 'E')
+            np.maximum.at(self.lb, index[lower], val[lower])
+            np.minimum.at(self.ub, index[upper], val[upper])
+            self._log('bounds', np.unique(index))
+        else:
+            n = len(index)
+            return self.addSparseRows(np.arange(n), index, np.ones((n,)), sense, val)
+
+    def addSparseRows(self, i, j, v, sense, rhs):
+        """Add len(rhs) rows with nonzeros (i[k], j[k]) = v[k]
+        (i counts from the first new row)
+        Return the row that holds every new row (see addConstraint)
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        rows = np.arange(self.numrows, self.numrows + len(rhs), dtype=np.int32)
+        if self.rowindex is not None:
+            i, j, v, sense, rhs, rows = self.rowindex.filter(
+                self, np.asarray(i), np.asarray(j), v, _senses(sense, len(rhs)), rhs)
+            if self.rowindex.changed:
+                self._log('rhs', np.unique(self.rowindex.changed).astype(np.int32))
+                self.rowindex.changed = []
+        self._append(i, j, v, sense, rhs)
+        self.numrows += len(rhs)
+        if len(rhs) > 0:
+            self._log('rows', self.numrows - len(rhs), len(rhs))
+        return rows
+
+    def _append(self, i, j, v, sense, rhs):
+        """append rows to A, rhs and sense (see addSparseRows)"""
+        self.A.add_sparse_rows(len(rhs), i, j, v)
+        self.__dict__['appended'].append((np.asarray(rhs, dtype=float),
+                                          _senses(sense, len(rhs))))
+
+    def _join(self):
+        """join blocks of rows appended to rhs and sense (see _append)"""
+        appended = self.__dict__['appended']
+        if appended:
+            self.__dict__['appended'] = []
+            self.__dict__['rhs'] = np.concatenate([self.__dict__['rhs']] + [a[0] for a in appended])
+            self.__dict__['sense'] = np.concatenate([self.__dict__['sense']] + [a[1] for a in appended])
+
+    def _flush(self):
+        """append pending rows (see addConstraint) in one block"""
+        pending = self.pending
+        if pending:
+            self.__dict__['pending'] = []
+            self._append(*_pack(pending))
+
+    def extend(self, constraints, chunk_size=10000):
+        """Add constraints from an iterable (e.g., a generator), chunk_size
+        at a time. Constraints are dictionaries like in addConstraint or
+        (indices, coeffs, sense, rhs) tuples. Each chunk is packed into
+        arrays and appended to A with addSparseRows, so only one chunk
+        is held as Python objects at a time. A is switched to 'coord'
+        format first (see compact).
+        Return {'read' (constraints read), 'rows' (rows added, fewer if
+        duplicates are skipped, see indexRows), 'chunks', 'time', 'rate'
+        (constraints read per second)}
+        """
+        t = time.time()
+        if self.A.format != 'coord':
+            self.A.compact(float)
+        first = self.numrows
+        constraints = iter(constraints)
+        read = chunks = 0
+        while True:
+            chunk = list(itertools.islice(constraints, chunk_size))
+            if not chunk:
+                break
+            i, j, v, sense, rhs = _pack(chunk)
+            del chunk
+            self.addSparseRows(i, j, v, sense, rhs)
+            read += len(rhs)
+            chunks += 1
+        t = time.time() - t
+        return {'read': read, 'rows': self.numrows - first, 'chunks': chunks,
+                'time': t, 'rate': read / max(t, 1e-9)}
+
     def addConstraintRows(self, r):
         # Arows = r[0], rhs = r[1], sense = r[2]
+        if self.rowindex is not None:
+            Arows = np.asarray(r[0], dtype=float)
+            i, j = np.nonzero(Arows)
+            self.addSparseRows(i, j, Arows[(i, j)], r[2], r[1])
+            return
         self.A.add_rows(r[0])
         self.rhs = np.concatenate([self.rhs, r[1]])
         self.sense = np.concatenate([self.sense, r[2]])
         self.numrows += len(r[1])
+        if len(r[1]) > 0:
+            self._log('rows', self.numrows - len(r[1]), len(r[1]))
         
+    def addColumns(self, obj, lb=None, ub=None, ctype=None, cols=None):
+        """Add len(obj) new variables (columns)
+        Bounds default to [-Inf, Inf], ctype to 'C'.
+        cols holds constraint coefficients of new columns in CPLEX format,
+        a dictionary with keys {'matbeg', 'matind', 'matval'} (see Matrix.to_cplex)
+        """
+        obj = np.asarray(obj, dtype=float)
+        n = len(obj)
+        assert n > 0
+        if lb is None:
+            lb = -np.Inf * np.ones((n,))
+        if ub is None:
+            ub = np.Inf * np.ones((n,))
+        if ctype is None:
+            ctype = ['C'] * n
+        matbeg, matcnt, matind, matval = column_arrays(cols, n)
+        assert len(matind) == 0 or matind.max() < self.numrows
+
+        self.A.add_sparse_cols(n, matind, np.repeat(np.arange(n, dtype=np.int32), matcnt),
+                               matval)
+
+        self.obj = np.concatenate([self.obj, obj])
+        self.lb = np.concatenate([self.lb, np.asarray(lb, dtype=float)])
+        self.ub = np.concatenate([self.ub, np.asarray(ub, dtype=float)])
+        self.ctype = np.concatenate([self.ctype, np.asarray(ctype, '|S1')])
+        self.numcols += n
+        self._log('cols', self.numcols - n, n)
+
+    def changeBounds(self, indices, lb=None, ub=None):
+        """Change bounds of variables indices
+        lb and ub are arrays (or scalars) aligned with indices;
+        None leaves the corresponding bound unchanged.
+        Return indices as an int32 array
+        """
+        indices = np.asarray(indices, dtype=np.int32).ravel()
+        if lb is not None:
+            self.lb[indices] = lb
+        if ub is not None:
+            self.ub[indices] = ub
+        self._log('bounds', indices)
+        return indices
+
+    def changeRHS(self, rows, rhs):
+        """Change rhs of rows (rhs is an array aligned with rows, or a scalar)"""
+        rows = np.asarray(rows, dtype=np.int32).ravel()
+        self.rhs[rows] = rhs
+        if self.rowindex is not None:
+            self.rowindex.changeRHS(rows, self.rhs[rows])
+        self._log('rhs', rows)
+        return rows
+
+    def changeObjective(self, obj, indices=None):
+        """Change objective coefficients of variables indices (default: all)"""
+        if indices is None:
+            indices = np.arange(self.numcols, dtype=np.int32)
+        indices = np.asarray(indices, dtype=np.int32).ravel()
+        self.obj[indices] = obj
+        self._log('obj', indices)
+        return indices
+
+    def changeVarType(self, ctype, indices=None):
+        """Change types ('C', 'B' or 'I') of variables indices (default: all)"""
+        if indices is None:
+            indices = np.arange(self.numcols, dtype=np.int32)
+        indices = np.asarray(indices, dtype=np.int32).ravel()
+        self.ctype[indices] = ctype
+        self._log('ctype', indices)
+        return indices
+
     def removeLastConstraint(self):
         self.removeLastConstraints(1)
 
     def removeLastConstraints(self, n):
+        self._log('delete', np.arange(self.numrows - n, self.numrows, dtype=np.int32))
         self.A.remove_last_rows(n)
         self.rhs = self.rhs[:-n]
         self.sense = self.sense[:-n]
         self.numrows -= n
+        if self.rowindex is not None:
+            self.rowindex.truncate(self.numrows)
+
+    def removeConstraints(self, rows):
+        """Remove constraints rows (row indices, in any order)
+        Return the map from old to new row indices (-1 for removed rows)
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int32))
+        self._log('delete', rows)
+        keep = np.ones((self.numrows,), dtype=bool)
+        keep[rows] = False
+        self.A.remove_rows(keep)
+        self.rhs = self.rhs[keep]
+        self.sense = self.sense[keep]
+        if self.rngval is not None:
+            self.rngval = self.rngval[keep]
+        if self.rowindex is not None:
+            self.rowindex.remove(keep)
+        self.numrows = int(keep.sum())
+        index = np.cumsum(keep, dtype=np.int32) - 1
+        index[~keep] = -1
+        return index
+
+    def copy(self):
+        """Return a copy that shares no arrays with this problem
+        (the copy has no pending rows and no journal)
+        """
+        self._flush()
+        self._join()
+        p = MPProb(0, self.numcols)
+        for name, value in self.__dict__.items():
+            if name in ('pending', 'appended', 'journal', 'journalstart', 'readers'):
+                continue
+            elif name == 'A':
+                p.__dict__['A'] = value.copy()
+            elif name == 'rowindex' and value is not None:
+                p.__dict__[name] = value.copy()
+            elif isinstance(value, np.ndarray):
+                p.__dict__[name] = value.copy()
+            elif name != 'Q':
+                p.__dict__[name] = value
+        return p
+
+    def indexRows(self, merge=False):
+        """Detect duplicate constraints from now on (see rowindex.RowIndex)
+        Rows added that duplicate an existing row (also when scaled by a
+        constant) are skipped, unless their rhs is tighter. With
+        merge=True, a tighter rhs replaces the rhs of the existing row
+        instead of adding a row. Rows already in p are indexed, duplicates
+        among them are kept. Call again after setA, setRHS or setSense.
+        With duplicates skipped, addConstraint does not always add a row:
+        it returns the row that holds the constraint.
+        Return the index; index.stats() reports duplicates found
+        """
+        self.rowindex = RowIndex(merge)
+        self.rowindex.build(self)
+        return self.rowindex
+
+    def dedupStats(self):
+        """rows deduplicated by the row index (see indexRows), or None"""
+        if self.rowindex is None:
+            return None
+        return self.rowindex.stats()
+
+    def compact(self, values=np.float64):
+        """Store A in compact form: 'coord' format with int32 indices and
+        values of type values
+        With values=np.float32 the matrix takes 12 bytes per nonzero, but
+        coefficients are rounded to ~7 significant digits, and backends
+        solve the rounded problem. sense and ctype are '|S1' arrays (one
+        byte per entry); senseCodes() and ctypeCodes() view them as uint8.
+        """
+        self.A.compact(values)
+
+    def senseCodes(self):
+        """uint8 code (ASCII) of every row sense, without copying"""
+        return np.asarray(self.sense, '|S1').view(np.uint8)
+
+    def ctypeCodes(self):
+        """uint8 code (ASCII) of every variable type, without copying"""
+        return np.asarray(self.ctype, '|S1').view(np.uint8)
+
+    def memory_usage(self):
+        """Return bytes taken by the problem: {'arrays' (obj, bounds, rhs, ...),
+        'A' (see Matrix.memory_usage), 'total'}
+        """
+        self._flush()
+        arrays = sum([a.nbytes for a in self.__dict__.values()
+                      if isinstance(a, np.ndarray)])
+        A = self.A.memory_usage()['bytes']
+        return {'arrays': arrays, 'A': A, 'total': arrays + A}
+
+    def rowDigests(self):
+        """Return a uint64 digest of every row (coefficients, sense, rhs)
+        Equal rows have equal digests, regardless of row position
+        """
+        i, j, v = self.A.to_arrays()
+        h = _mix(_mix(j.astype(np.uint64)) ^ _floatbits(v))
+        d = np.zeros((self.numrows,), dtype=np.uint64)
+        np.add.at(d, i, h)
+        d = _mix(d ^ _floatbits(self.rhs))
+        sense = self.senseCodes().astype(np.uint64)
+        return _mix(d ^ sense)
+
+    def fingerprint(self, rows=True, obj=True):
+        """Return a hex digest identifying the problem
+        rows=False leaves out constraints, obj=False leaves out the objective
+        """
+        h = hashlib.sha1()
+        h.update(repr((self.numcols, self.maximize, self.probtype)))
+        for a in (self.lb, self.ub):
+            h.update(np.asarray(a, dtype=float).tobytes())
+        h.update(np.asarray(self.ctype, '|S1').tobytes())
+        if obj:
+            h.update(np.asarray(self.obj, dtype=float).tobytes())
+        if rows:
+            h.update(repr(self.numrows))
+            h.update(self.rowDigests().tobytes())
+            if self.rngval is not None:
+                h.update(np.asarray(self.rngval, dtype=float).tobytes())
+        return h.hexdigest()
 
     def validate(self):
         assert self.numrows >= 0
@@ -193,3 +589,96 @@ class MPProb(object):
             print ' '.join([s(x) for x in row]), " ", s(self.sense[i]), " ", int(self.rhs[i])
 
 
+def compareStorage(p, values=np.float32):
+    """Report bytes taken by p and the time of matrix conversions for
+    backends, with A in its current store and in compact form (see
+    MPProb.compact)
+    """
+    report = {}
+    for key in ('current', 'compact'):
+        q = p.copy()
+        t = time.time()
+        if key == 'compact':
+            q.compact(values)
+        times = {'compact': time.time() - t}
+        for name in ('to_arrays', 'to_cplex', 'to_coordinate'):
+            t = time.time()
+            getattr(q.A, name)()
+            times[name] = time.time() - t
+        report[key] = {'bytes': q.memory_usage()['total'],
+                       'A': q.A.memory_usage(), 'time': times}
+    return report
+
+def _pack(constraints):
+    """pack constraints (dictionaries like in MPProb.addConstraint or
+    (indices, coeffs, sense, rhs) tuples) into arrays i, j, v, sense, rhs
+    (see MPProb.addSparseRows)
+    """
+    counts, j, v = [], [], []
+    sense = np.empty((len(constraints),), '|S1')
+    rhs = np.empty((len(constraints),))
+    for k, c in enumerate(constraints):
+        if isinstance(c, dict):
+            c = c['indices'], c['coeffs'], c['sense'], c['rhs']
+        assert len(c[0]) == len(c[1])
+        counts.append(len(c[0]))
+        j.extend(c[0])
+        v.extend(c[1])
+        sense[k] = c[2]
+        rhs[k] = c[3]
+    i = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    return i, np.asarray(j, dtype=np.int32), np.asarray(v, dtype=float), sense, rhs
+
+def netChanges(records, numrows):
+    """Reduce change records (see MPProb.changes) to their net effect on
+    a reader that had numrows rows before them. Row indices of every
+    record are mapped through the deletions that follow it, and rows
+    added and deleted again are dropped. Return a dictionary with:
+        'delete'  rows of the reader to delete (sorted)
+        'rows'    number of rows of the reader kept; they are rows 0..
+                  of the problem, and the rows after them are new
+        'rhs'     rows kept whose rhs changed
+        'bounds', 'obj', 'ctype'  columns changed (sorted)
+    Columns added are the columns of the problem after those of the reader
+    """
+    # rows are only appended, so kept rows of the reader come first, and
+    # only they are tracked (new rows after them are just counted)
+    origin = np.arange(numrows) # row of the reader
+    dirty = np.zeros((numrows,), dtype=bool) # rhs changed
+    cols = {'bounds': [], 'obj': [], 'ctype': []}
+    for record in records:
+        kind = record[0]
+        if kind == 'delete':
+            rows = np.asarray(record[1])
+            rows = rows[rows < len(origin)]
+            if len(rows) > 0:
+                keep = np.ones((len(origin),), dtype=bool)
+                keep[rows] = False
+                origin, dirty = origin[keep], dirty[keep]
+        elif kind == 'rhs':
+            rows = np.asarray(record[1])
+            dirty[rows[rows < len(origin)]] = True
+        elif kind not in ('rows', 'cols'):
+            cols[kind].append(record[1])
+    changes = {'delete': np.setdiff1d(np.arange(numrows), origin).astype(np.int32),
+               'rows': len(origin),
+               'rhs': np.nonzero(dirty)[0].astype(np.int32)}
+    for kind, indices in cols.items():
+        changes[kind] = np.unique(np.concatenate(indices)).astype(np.int32) \
+                        if indices else np.empty((0,), dtype=np.int32)
+    return changes
+
+def _senses(sense, n):
+    """sense (an array, or a single sense) as an '|S1' array of length n"""
+    s = np.empty((n,), '|S1')
+    s[:] = sense
+    return s
+
+def _mix(x):
+    """splitmix64 finalizer on uint64 arrays"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+def _floatbits(v):
+    return np.ascontiguousarray(v, dtype=float).view(np.uint64)
@@ -0,0 +1,162 @@
+import threading
+from contextlib import contextmanager
+
+from asyncsolve import Coalescer, SolveStats, solveMany, newExecutor, asyncio
+
+class SolverPool(object):
+    """Pool of built solvers for recently used problems
+
+    Building a solver (bounds, matrix conversion, copylp) is expensive.
+    The pool keeps solvers for recently used problems, keyed by
+    MPProb.fingerprint(), and leases them out. Rows added and bounds,
+    rhs, objective and variable types changed by the caller are rolled
+    back when the solver is returned (see Solver.rollback). A solver
+    whose problem still differs afterwards (e.g., rows were removed, or
+    columns added) is dropped instead.
+
+        pool = SolverPool(GLPKSolver, maxinstances=4)
+        with pool.leased(p) as s:
+            s.addConstraint(c)
+            solution = s.solve(obj)
+
+    Idle solvers are evicted least recently used first when there are
+    more than maxinstances solvers, or when idle solvers take more than
+    maxbytes (estimated, see solverBytes).
+
+    From asyncio code, submit() solves for many objectives without
+    blocking the event loop:
+        solutions = await pool.submit(p, objs)
+    """
+
+    def __init__(self, solverclass, maxinstances=8, maxbytes=None):
+        self.solverclass = solverclass
+        self.maxinstances = maxinstances
+        self.maxbytes = maxbytes
+        self.idle = [] # (key, solver, bytes), least recently used first
+        self.leases = {} # id(solver) -> (key, checkpoint)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discarded = 0 # returned with a changed problem
+        self.coalescers = {} # fingerprint -> Coalescer
+        self.asyncstats = SolveStats()
+        self.executor = None
+
+    def lease(self, p, name='pooled solver'):
+        """return a solver for problem p
+        The solver works on its own copy of p (solver.p).
+        Give it back with release()
+        """
+        key = p.fingerprint()
+        s = None
+        self.lock.acquire()
+        try:
+            for k in range(len(self.idle)-1, -1, -1):
+                if self.idle[k][0] == key:
+                    s = self.idle.pop(k)[1]
+                    break
+            if s is None:
+                self.misses += 1
+                self._evict(self.maxinstances - 1)
+            else:
+                self.hits += 1
+        finally:
+            self.lock.release()
+
+        if s is None:
+            # build outside the lock
+            s = self.solverclass(p.copy(), name)
+        cp = s.checkpoint()
+        self.lock.acquire()
+        try:
+            self.leases[id(s)] = (key, cp)
+        finally:
+            self.lock.release()
+        return s
+
+    def release(self, s):
+        """roll back changes made by the caller and return s to the pool
+        (or drop it, if its problem no longer matches the key it was
+        leased for)
+        """
+        key, cp = self.leases[id(s)]
+        reusable = s.p.numcols == cp['numcols']
+        if reusable:
+            s.rollback(cp)
+            reusable = s.p.fingerprint() == key
+        self.lock.acquire()
+        try:
+            del self.leases[id(s)]
+            if reusable:
+                self.idle.append((key, s, solverBytes(s)))
+                self._evict(self.maxinstances)
+            else:
+                self.discarded += 1
+        finally:
+            self.lock.release()
+
+    @contextmanager
+    def leased(self, p, name='pooled solver'):
+        s = self.lease(p, name)
+        try:
+            yield s
+        finally:
+            self.release(s)
+
+    def submit(self, p, objs, window=0.002):
+        """return an asyncio future of the list of solutions of problem p
+        for objectives objs (k x numcols)
+        Backend calls run on an executor with maxinstances threads.
+        Requests for the same problem that arrive within window seconds
+        are solved in one sweep on one leased solver
+        """
+        key = p.fingerprint()
+        if key not in self.coalescers:
+            if self.executor is None:
+                self.executor = newExecutor(self.maxinstances)
+            q = p.copy()
+            def sweep(objs):
+                with self.leased(q) as s:
+                    return solveMany(s, objs)
+            self.coalescers[key] = Coalescer(sweep, self.executor, window,
+                                             stats=self.asyncstats)
+        coalescer = self.coalescers[key]
+        return asyncio.gather(*[coalescer.submit(obj) for obj in objs])
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.idle = []
+        finally:
+            self.lock.release()
+
+    def hitrate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return float(self.hits) / total
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'discarded': self.discarded,
+                'hitrate': self.hitrate(),
+                'idle': len(self.idle), 'leased': len(self.leases),
+                'bytes': sum([b for k, s, b in self.idle]),
+                'async': self.asyncstats.asdict()}
+
+    def _evict(self, maxinstances):
+        """drop idle solvers until limits are met (lock must be held)"""
+        def toomany():
+            return len(self.idle) + len(self.leases) > maxinstances
+        def toobig():
+            return (self.maxbytes is not None and
+                    sum([b for k, s, b in self.idle]) > self.maxbytes)
+        while self.idle and (toomany() or toobig()):
+            self.idle.pop(0)
+            self.evictions += 1
+
+
+def solverBytes(s):
+    """estimated memory taken by solver s (see Solver.memory_usage)"""
+    return s.memory_usage()['total']
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+
+def rowlimits(p):
+    """Return lower and upper limits L, U of the row activities a x of p
+    ('L': a x <= rhs, 'G': a x >= rhs, 'E': a x = rhs, 'R': a x between
+    rhs and rhs + rngval)
+    """
+    sense = np.asarray(p.sense, '|S1')
+    rhs = np.asarray(p.rhs, dtype=float)
+    L = np.where(sense == 'L', -np.Inf, rhs)
+    U = np.where(sense == 'G', np.Inf, rhs)
+    R = sense == 'R'
+    if R.any():
+        if p.rngval is None:
+            raise ValueError("range rows without rngval")
+        rngval = np.asarray(p.rngval, dtype=float)[R]
+        L[R] = rhs[R] + np.minimum(0, rngval)
+        U[R] = rhs[R] + np.maximum(0, rngval)
+    return L, U
+
+def activitybounds(p, lb=None, ub=None):
+    """Return the smallest and largest row activities a x of p over the
+    box lb <= x <= ub (default: bounds of p)
+    """
+    i, j, v = _nonzeros(p)
+    lb = np.asarray(p.lb if lb is None else lb, dtype=float)
+    ub = np.asarray(p.ub if ub is None else ub, dtype=float)
+    amin, amax = _activity(i, j, v, lb, ub, p.numrows)[:2]
+    return amin, amax
+
+def tightenbounds(p, rounds=10, tol=1e-9, inplace=True):
+    """Feasibility-based bound tightening of the variables of p
+
+    Every row L <= a x <= U bounds each of its variables through the
+    smallest and largest activity of the other variables of the row:
+    for a_j > 0, x_j <= (U - min of the rest) / a_j and x_j >= (L - max
+    of the rest) / a_j (the other way round for a_j < 0). Activities of
+    all rows, and the new bounds of all columns, are computed with
+    vectorized reductions over the nonzeros of A; passes are repeated
+    until no bound moves by more than tol (relative to the bound), or
+    for at most rounds passes. Bounds of integer and binary variables
+    are rounded.
+
+    Stops as soon as a row cannot reach its limits, or a variable's
+    bounds cross. With inplace=True (and p feasible), the tightened
+    bounds are set with p.changeBounds, so solvers of p pick them up.
+    Return lb, ub and a dictionary with:
+        'tightened'  number of bounds changed
+        'columns'    columns with a changed bound
+        'rounds'     passes done
+        'infeasible' True if p was found infeasible
+        'row', 'column'  row or column that proved it (or None)
+        'time'       seconds
+    """
+    start = time.time()
+    i, j, v = _nonzeros(p)
+    L, U = rowlimits(p)
+    lb0 = np.asarray(p.lb, dtype=float)
+    ub0 = np.asarray(p.ub, dtype=float)
+    lb, ub = lb0.copy(), ub0.copy()
+    integer = np.asarray(p.ctype, '|S1') != 'C' if p.ctype is not None else None
+    stats = {'infeasible': False, 'row': None, 'column': None}
+    k = 0
+    while k < rounds:
+        k += 1
+        amin, amax, rmin, rmax = _activity(i, j, v, lb, ub, p.numrows)
+        bad = np.nonzero((amin > U + _gap(U, tol)) | (amax < L - _gap(L, tol)))[0]
+        if len(bad) > 0:
+            stats.update(infeasible=True, row=int(bad[0]))
+            break
+        # bounds of v x_j implied by every nonzero
+        with np.errstate(invalid='ignore'):
+            hi = U[i] - rmin
+            lo = L[i] - rmax
+        pos = v > 0
+        newub = np.empty((p.numcols,))
+        newub[:] = np.Inf
+        np.minimum.at(newub, j, np.where(pos, hi, lo) / v)
+        newlb = np.empty((p.numcols,))
+        newlb[:] = -np.Inf
+        np.maximum.at(newlb, j, np.where(pos, lo, hi) / v)
+        # NaN (inf - inf) means no bound
+        newub[np.isnan(newub)] = np.Inf
+        newlb[np.isnan(newlb)] = -np.Inf
+        if integer is not None and integer.any():
+            newub[integer] = np.floor(newub[integer] + tol)
+            newlb[integer] = np.ceil(newlb[integer] - tol)
+
+        up = newlb > lb + _gap(newlb, tol)
+        down = newub < ub - _gap(newub, tol)
+        lb[up] = newlb[up]
+        ub[down] = newub[down]
+        cross = np.nonzero(lb > ub + _gap(ub, tol))[0]
+        if len(cross) > 0:
+            stats.update(infeasible=True, column=int(cross[0]))
+            break
+        # bounds crossing within tol are equal
+        lb = np.minimum(lb, ub)
+        if not (up.any() or down.any()):
+            break
+
+    changed = (lb != lb0) | (ub != ub0)
+    stats['columns'] = np.nonzero(changed)[0].astype(np.int32)
+    stats['tightened'] = int((lb != lb0).sum() + (ub != ub0).sum())
+    stats['rounds'] = k
+    if inplace and not stats['infeasible'] and changed.any():
+        cols = stats['columns']
+        p.changeBounds(cols, lb[cols], ub[cols])
+    stats['time'] = time.time() - start
+    return lb, ub, stats
+
+def _gap(x, tol):
+    """tolerance relative to finite x"""
+    return tol * (1 + np.abs(np.where(np.isinf(x), 0.0, x)))
+
+def _nonzeros(p):
+    i, j, v = p.A.to_arrays()
+    v = np.asarray(v, dtype=float)
+    nz = v != 0
+    return i[nz], j[nz], v[nz]
+
+def _activity(i, j, v, lb, ub, m):
+    """smallest and largest activity of every row, and of every row
+    without each of its nonzeros (aligned with i, j, v), over the box
+    lb <= x <= ub
+    """
+    cmin = np.where(v > 0, v * lb[j], v * ub[j])
+    cmax = np.where(v > 0, v * ub[j], v * lb[j])
+    amin, rmin = _rest(cmin, i, m, -np.Inf)
+    amax, rmax = _rest(cmax, i, m, np.Inf)
+    return amin, amax, rmin, rmax
+
+def _rest(c, i, m, inf):
+    """row sums of contributions c (infinite ones are inf), and row sums
+    without each contribution
+    """
+    infinite = np.isinf(c)
+    ninf = np.bincount(i, weights=infinite, minlength=m)
+    total = np.bincount(i, weights=np.where(infinite, 0.0, c), minlength=m)
+    # the rest of a row is finite if its only infinite contribution is left out
+    rest = np.where(infinite, total[i], total[i] - np.where(infinite, 0.0, c))
+    rest[ninf[i] - infinite > 0] = inf
+    return np.where(ninf > 0, inf, total), rest
@@ -0,0 +1,108 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from asyncsolve import solveMany
+
+def directions(features, features2=None, decimals=12):
+    """Difference vectors d[a,b] = features[a] - features2[b] of all pairs
+    as scale[a,b] * dirs[index[a,b]], where dirs are the distinct
+    directions (rows scaled to max |d| = 1, so that positive multiples
+    share a direction). index is -1 where d[a,b] is 0.
+    Return dirs, scale, index
+    """
+    f1 = np.asarray(features, dtype=float)
+    f2 = f1 if features2 is None else np.asarray(features2, dtype=float)
+    d = (f1[:, None, :] - f2[None, :, :]).reshape(-1, f1.shape[1])
+    scale = np.abs(d).max(1) if d.shape[1] > 0 else np.zeros((len(d),))
+    nonzero = scale > 0
+    unit = d[nonzero] / scale[nonzero, None]
+    index = -np.ones((len(d),), dtype=int)
+    if len(unit) > 0:
+        # rounding merges directions that differ by rounding errors only
+        # (+ 0.0 turns -0.0 into 0.0)
+        dirs, first, inverse = np.unique(np.round(unit, decimals) + 0.0, axis=0,
+                                         return_index=True, return_inverse=True)
+        dirs = unit[first]
+        index[nonzero] = inverse
+    else:
+        dirs = unit
+    shape = (len(f1), len(f2))
+    return dirs, scale.reshape(shape), index.reshape(shape)
+
+def similarityOrder(dirs):
+    """order of dirs along their principal direction, so that neighbours
+    in the order are similar objectives
+    """
+    if len(dirs) < 3:
+        return np.arange(len(dirs))
+    centered = dirs - dirs.mean(0)
+    vt = np.linalg.svd(centered, full_matrices=False)[2]
+    return np.argsort(centered.dot(vt[0]), kind='mergesort')
+
+def _solvechunk(args):
+    solverclass, p, objs = args
+    s = solverclass(p, 'regret worker')
+    return _objvals(s, objs)
+
+def _objvals(s, objs):
+    """optimal values for objectives objs, NaN where there is no optimum"""
+    solutions = solveMany(s, objs)
+    return np.array([sol['objval'] if sol['feasible'] else np.nan
+                     for sol in solutions], dtype=float)
+
+def pairwiseMaxRegret(s, features, features2=None, workers=1,
+                      processes=False, solverclass=None):
+    """Max regret of every pair of alternatives over the feasible region
+    of solver s: R[a,b] = max_w (features[a] - features2[b]).w
+    (features2 defaults to features; rows are alternatives, columns
+    variables of s.p).
+
+    Every distinct difference direction is solved once (R is positively
+    homogeneous in the difference), in an order that keeps neighbouring
+    objectives similar, so that each solve warm-starts from the basis of
+    the previous one. With workers > 1, the ordered directions are split
+    into contiguous chunks solved by separate solvers of type
+    solverclass (default: the type of s), in threads or processes.
+    Pairs without an optimum (infeasible or unbounded) get NaN.
+    """
+    dirs, scale, index = directions(features, features2)
+    order = similarityOrder(dirs)
+    dirs = dirs[order]
+    rank = np.argsort(order)
+    index[index >= 0] = rank[index[index >= 0]]
+    sign = 1.0 if s.p.maximize else -1.0
+    objs = sign * dirs
+
+    values = np.empty((len(objs),))
+    if workers <= 1 or len(objs) < 2 * workers:
+        values[:] = _objvals(s, objs)
+    else:
+        if solverclass is None:
+            solverclass = type(s)
+        chunks = np.array_split(np.arange(len(objs)), workers)
+        if processes:
+            pool = Pool(workers)
+            try:
+                results = pool.map(_solvechunk, [(solverclass, s.p.copy(), objs[c])
+                                                 for c in chunks])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            solvers = [s] + [solverclass(s.p.copy(), s.name + ' regret worker')
+                             for c in chunks[1:]]
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(lambda k: _objvals(solvers[k], objs[chunks[k]]),
+                                   range(len(chunks)))
+            finally:
+                pool.close()
+                pool.join()
+        for c, r in zip(chunks, results):
+            values[c] = r
+
+    R = np.zeros(scale.shape)
+    pairs = index >= 0
+    R[pairs] = scale[pairs] * sign * values[index[pairs]]
+    return R
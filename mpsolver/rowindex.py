@@ -0,0 +1,173 @@
+import numpy as np
+
+# sense of a row multiplied by -1
+FLIPPED = {'L': 'G', 'G': 'L', 'E': 'E'}
+
+class RowIndex(object):
+    """Index of constraint signatures for duplicate detection
+
+    A row a x sense rhs is normalized by s = max |a| times the sign of
+    its first nonzero: the signature is (sorted indices, a / s, sense,
+    with 'L' and 'G' swapped if s < 0) and the normalized rhs is rhs / s.
+    So rows that are positive or negative multiples of each other share
+    a signature. Range rows and empty rows are not indexed.
+
+    A new row with the signature of an indexed row is a duplicate unless
+    its normalized rhs is tighter (or, for 'E' rows, different). Tighter
+    duplicates are added as new rows, or with merge=True, tighten the rhs
+    of the indexed row instead (rows whose rhs changed are collected in
+    changed, so that solvers can update their copy).
+    """
+
+    def __init__(self, merge=False, decimals=12):
+        self.merge = merge
+        self.decimals = decimals
+        self.rows = {} # signature -> latest row with that signature
+        self.keys = [] # signature of every row (None: not indexed)
+        self.norm = [] # normalized rhs of every row
+        self.scale = [] # normalizing factor of every row
+        self.prev = [] # earlier row with the same signature, or -1
+        self.changed = [] # rows whose rhs was tightened (merge=True)
+        self.skipped = 0
+        self.merged = 0
+
+    def signature(self, j, v, sense):
+        """return signature and normalizing factor of a row with nonzeros
+        v in columns j, or (None, 1.0) if it is not indexed
+        """
+        nz = v != 0
+        j, v = j[nz], v[nz]
+        if len(v) == 0 or sense not in FLIPPED:
+            return None, 1.0
+        order = np.argsort(j, kind='mergesort')
+        j, v = j[order], v[order]
+        s = np.abs(v).max()
+        if v[0] < 0:
+            s = -s
+            sense = FLIPPED[sense]
+        # + 0.0 turns -0.0 into 0.0
+        coeffs = np.round(v / s, self.decimals) + 0.0
+        key = (np.asarray(j, dtype=np.int32).tobytes(), coeffs.tobytes(), sense)
+        return key, s
+
+    def build(self, p):
+        """index all rows of problem p"""
+        self.rows, self.keys, self.norm, self.scale, self.prev = {}, [], [], [], []
+        self.changed = []
+        i, j, v = p.A.to_arrays()
+        start = np.searchsorted(i, np.arange(p.numrows + 1))
+        for r in xrange(p.numrows):
+            b, e = start[r], start[r + 1]
+            key, s = self.signature(j[b:e], np.asarray(v[b:e], dtype=float), p.sense[r])
+            self._append(key, p.rhs[r] / s, s)
+
+    def filter(self, p, i, j, v, sense, rhs):
+        """drop duplicates from rows about to be added to p: nonzeros
+        (i[k], j[k]) = v[k] (i counts from the first new row), arrays
+        sense and rhs. The rows kept are indexed as rows p.numrows..
+        Return i, j, v, sense, rhs of the rows kept (i renumbered), and
+        the row of p that holds every new row: the row it is added as, or
+        the row it duplicates or was merged into
+        """
+        n = len(rhs)
+        rhs = np.array(rhs, dtype=float)
+        order = np.argsort(i, kind='mergesort')
+        i, j, v = i[order], j[order], np.asarray(v, dtype=float)[order]
+        start = np.searchsorted(i, np.arange(n + 1))
+        keep = np.ones((n,), dtype=bool)
+        first = p.numrows
+        kept = [] # new rows kept, in order
+        rows = np.empty((n,), dtype=np.int32)
+        for k in xrange(n):
+            key, s = self.signature(j[start[k]:start[k + 1]], v[start[k]:start[k + 1]], sense[k])
+            norm = rhs[k] / s
+            r = self.rows.get(key, -1) if key is not None else -1
+            rows[k] = r
+            if r >= 0:
+                if not self._tighter(key[2], norm, self.norm[r]):
+                    keep[k] = False
+                    self.skipped += 1
+                    continue
+                if self.merge and key[2] != 'E':
+                    keep[k] = False
+                    self.merged += 1
+                    self.norm[r] = norm
+                    if r < first:
+                        p.rhs[r] = norm * self.scale[r]
+                        self.changed.append(r)
+                    else:
+                        rhs[kept[r - first]] = norm * self.scale[r]
+                    continue
+            rows[k] = first + len(kept)
+            kept.append(k)
+            self._append(key, norm, s)
+        if keep.all():
+            return i, j, v, sense, rhs, rows
+        newrow = np.cumsum(keep) - 1
+        nz = keep[i]
+        return newrow[i[nz]], j[nz], v[nz], sense[keep], rhs[keep], rows
+
+    def changeRHS(self, rows, rhs):
+        """update the normalized rhs of rows to rhs (aligned with rows)"""
+        for r, b in zip(rows, rhs):
+            self.norm[r] = b / self.scale[r]
+
+    def truncate(self, n):
+        """forget rows n.."""
+        for r in xrange(len(self.keys) - 1, n - 1, -1):
+            key = self.keys.pop()
+            if key is not None and self.rows.get(key) == r:
+                if self.prev[r] >= 0:
+                    self.rows[key] = self.prev[r]
+                else:
+                    del self.rows[key]
+            self.prev.pop()
+        del self.norm[n:]
+        del self.scale[n:]
+        self.changed = [r for r in self.changed if r < n]
+
+    def remove(self, keep):
+        """forget rows where keep (a boolean array) is False, renumbering
+        the others
+        """
+        rows = np.nonzero(keep)[0]
+        keys = [self.keys[r] for r in rows]
+        norm = [self.norm[r] for r in rows]
+        scale = [self.scale[r] for r in rows]
+        index = np.cumsum(keep) - 1
+        changed = [int(index[r]) for r in self.changed if keep[r]]
+        self.rows, self.keys, self.norm, self.scale, self.prev = {}, [], [], [], []
+        for key, nr, s in zip(keys, norm, scale):
+            self._append(key, nr, s)
+        self.changed = changed
+
+    def copy(self):
+        c = RowIndex(self.merge, self.decimals)
+        c.rows = dict(self.rows)
+        c.keys, c.norm, c.scale, c.prev = (list(self.keys), list(self.norm),
+                                           list(self.scale), list(self.prev))
+        c.changed = list(self.changed)
+        c.skipped, c.merged = self.skipped, self.merged
+        return c
+
+    def stats(self):
+        return {'rows': len(self.keys), 'signatures': len(self.rows),
+                'skipped': self.skipped, 'merged': self.merged,
+                'deduplicated': self.skipped + self.merged}
+
+    def _append(self, key, norm, s):
+        r = len(self.keys)
+        self.keys.append(key)
+        self.norm.append(norm)
+        self.scale.append(s)
+        self.prev.append(self.rows.get(key, -1) if key is not None else -1)
+        if key is not None:
+            self.rows[key] = r
+
+    def _tighter(self, sense, norm, old):
+        """is normalized rhs norm tighter than old (different for 'E')?"""
+        if sense == 'L':
+            return norm < old
+        elif sense == 'G':
+            return norm > old
+        return norm != old
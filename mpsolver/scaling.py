@@ -0,0 +1,198 @@
+import time
+import numpy as np
+
+from solver import Solver
+from solution import derived
+
+def scalefactors(p, method='geometric', passes=20, tol=0.9, pow2=True):
+    """Compute row and column scale factors r, c for the matrix A of p
+
+    The scaled matrix is diag(r) A diag(c).
+    method is 'geometric' (iterative geometric mean scaling, stops when
+    the ratio max|a|/min|a| improves by less than a factor tol), or
+    'equilibrium' (geometric scaling followed by row and then column
+    equilibration, so that the largest entry of every row and column is 1).
+    With pow2=True, factors are rounded to powers of 2 so that scaling
+    does not introduce rounding errors.
+    """
+    i, j, v = p.A.to_arrays()
+    a = np.abs(v)
+    r = np.ones((p.numrows,))
+    c = np.ones((p.numcols,))
+    if len(a) == 0:
+        return r, c
+
+    ratio = scaleratio(a)
+    for k in range(passes):
+        r /= np.sqrt(_reduce(np.fmax, a*r[i]*c[j], i, p.numrows) *
+                     _reduce(np.fmin, a*r[i]*c[j], i, p.numrows))
+        c /= np.sqrt(_reduce(np.fmax, a*r[i]*c[j], j, p.numcols) *
+                     _reduce(np.fmin, a*r[i]*c[j], j, p.numcols))
+        newratio = scaleratio(a*r[i]*c[j])
+        if newratio > tol * ratio:
+            break
+        ratio = newratio
+
+    if method == 'equilibrium':
+        r /= _reduce(np.fmax, a*r[i]*c[j], i, p.numrows)
+        c /= _reduce(np.fmax, a*r[i]*c[j], j, p.numcols)
+    elif method != 'geometric':
+        raise ValueError("unknown scaling method %s" % (method,))
+
+    if pow2:
+        r = 2.0 ** np.round(np.log2(r))
+        c = 2.0 ** np.round(np.log2(c))
+    return r, c
+
+def _reduce(ufunc, x, index, n):
+    """ufunc-reduce x by index (ufunc ignoring NaN), 1 where index has no entries"""
+    out = np.empty((n,))
+    out[:] = np.nan
+    ufunc.at(out, index, x)
+    out[np.isnan(out)] = 1.0
+    return out
+
+def scaleratio(a):
+    """max|a|/min|a| over nonzeros a"""
+    a = np.abs(a)
+    if len(a) == 0:
+        return 1.0
+    return a.max() / a.min()
+
+def scaled(p, r, c):
+    """Return a copy of p scaled by row factors r and column factors c
+    (x = c * x' for solutions x' of the scaled problem)
+    """
+    q = p.copy()
+    # rows reach q after the row index of p dropped duplicates, and the
+    # signatures of p do not hold for the scaled rows
+    q.rowindex = None
+    i, j, v = p.A.to_arrays()
+    q.A.init(p.numrows, p.numcols, len(v))
+    q.A.put(i, j, v * r[i] * c[j])
+    q.obj = np.asarray(p.obj, dtype=float) * c
+    q.lb = np.asarray(p.lb, dtype=float) / c
+    q.ub = np.asarray(p.ub, dtype=float) / c
+    q.rhs = np.asarray(p.rhs, dtype=float) * r
+    if p.rngval is not None:
+        q.rngval = np.asarray(p.rngval, dtype=float) * r
+    return q
+
+
+class ScaledSolver(Solver):
+    """Solve a scaled copy of p with a solver of type solverclass
+
+    Solutions are unscaled transparently, so the solver can be used in
+    place of an unscaled one. See scalefactors for method and passes.
+    """
+    def __init__(self, p, solverclass, name='scaled solver',
+                 method='geometric', passes=20):
+        Solver.__init__(self, p, name)
+        self.r, self.c = scalefactors(p, method, passes)
+        self.solver = solverclass(scaled(p, self.r, self.c), name)
+
+    def solve(self, obj=None):
+        self.sync()
+        if obj is not None:
+            obj = np.asarray(obj, dtype=float) * self.c
+        return self.unscale(self.solver.solve(obj))
+
+    def solution(self):
+        return self.unscale(self.solver.solution())
+
+    def solveManyRHS(self, rhs_batch, rows=None, stop=False):
+        """see Solver.solveManyRHS; rhs are scaled like their rows"""
+        self.sync()
+        if rows is None:
+            rows = np.arange(self.p.numrows, dtype=np.int32)
+        rows = np.asarray(rows, dtype=np.int32)
+        rhs_batch = np.asarray(rhs_batch, dtype=float).reshape((-1, len(rows)))
+        r = self.solver.solveManyRHS(rhs_batch * self.r[rows], rows, stop)
+        r['x'] = r['x'] * self.c
+        return r
+
+    def unscale(self, s):
+        """solution of p from solution s of the scaled problem"""
+        factors = {'x': self.c, 'reduced cost': 1 / self.c,
+                   'activity': 1 / self.r, 'dual': self.r, 'y': self.r}
+        fetchers = dict((key, lambda key=key, f=f: np.asarray(s[key]) * f)
+                        for key, f in factors.items() if key in s)
+        if 'x primal' in s:
+            fetchers['x primal'] = lambda: list(np.asarray(s['x primal']) * self.c)
+        return derived(s, fetchers)
+
+    def _addrows(self, first):
+        """add rows first.. of p, each scaled by a power of 2 that brings
+        its largest scaled coefficient close to 1
+        """
+        q = self.solver.p
+        i, j, v = self.p.A.to_arrays()
+        k = i >= first
+        i, j, v = i[k] - first, j[k], v[k] * self.c[j[k]]
+        n = self.p.numrows - first
+        big = np.zeros((n,))
+        np.maximum.at(big, i, np.abs(v))
+        r = np.ones((n,))
+        r[big > 0] = 2.0 ** np.round(-np.log2(big[big > 0]))
+        self.r = np.append(self.r, r)
+        q.addSparseRows(i, j, v * r[i], self.p.sense[first:], self.p.rhs[first:] * r)
+        self.solver.sync()
+
+    def _addcols(self, first):
+        """add columns first.. of p, each scaled by a power of 2 that
+        brings its largest scaled coefficient close to 1
+        """
+        matbeg, matcnt, matind, matval = self._colarrays(first)
+        n = self.p.numcols - first
+        col = np.repeat(np.arange(n), matcnt)
+        v = matval * self.r[matind]
+        big = np.zeros((n,))
+        np.maximum.at(big, col, np.abs(v))
+        c = np.ones((n,))
+        c[big > 0] = 2.0 ** np.round(-np.log2(big[big > 0]))
+        self.c = np.append(self.c, c)
+        self.solver.p.addColumns(self.p.obj[first:] * c, self.p.lb[first:] / c,
+                                 self.p.ub[first:] / c, self.p.ctype[first:],
+                                 {'matbeg': matbeg, 'matind': matind, 'matval': v * c[col]})
+        self.solver.sync()
+
+    def _chgrhs(self, rows):
+        self.solver.p.changeRHS(rows, self.p.rhs[rows] * self.r[rows])
+        self.solver.sync()
+
+    def _delrows(self, rows):
+        self.r = np.delete(self.r, rows)
+        self.solver.removeConstraints(rows)
+
+    def _chgbds(self, indices):
+        self.solver.changeBounds(indices, self.p.lb[indices] / self.c[indices],
+                                 self.p.ub[indices] / self.c[indices])
+
+    def _chgobj(self, indices):
+        self.solver.p.changeObjective(self.p.obj[indices] * self.c[indices], indices)
+        self.solver.sync()
+
+    def _chgctype(self, indices):
+        self.solver.p.changeVarType(self.p.ctype[indices], indices)
+        self.solver.sync()
+
+
+def compareScaling(p, solverclass, obj=None, method='geometric'):
+    """Solve p unscaled and scaled, and report matrix ratio max|a|/min|a|,
+    simplex iterations (if the backend reports them) and time
+    """
+    report = {}
+    for key, scale in (('unscaled', False), ('scaled', True)):
+        t = time.time()
+        if scale:
+            s = ScaledSolver(p, solverclass, method=method)
+            ratio = scaleratio(s.solver.p.A.to_arrays()[2])
+        else:
+            s = solverclass(p.copy())
+            ratio = scaleratio(p.A.to_arrays()[2])
+        solution = s.solve(obj)
+        report[key] = {'ratio': ratio,
+                       'iterations': solution.get('iterations'),
+                       'objval': solution['objval'],
+                       'time': time.time() - t}
+    return report
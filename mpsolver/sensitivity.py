@@ -0,0 +1,112 @@
+import numpy as np
+
+from solver import BASIC
+
+def analyze(p, obj, x, basis, tol=1e-9):
+    """Sensitivity analysis of an optimal basic solution x of p
+
+    basis is {'cstat', 'rstat'} (see Solver.getBasis). Row slacks are
+    s = rhs - A x. Return a dictionary of arrays:
+        'dual'          row duals y (d objval / d rhs)
+        'reduced cost'  obj - A'y
+        'obj lower', 'obj upper'  objective coefficient ranges
+        'rhs lower', 'rhs upper'  right-hand side ranges
+    Ranges are for one coefficient at a time, over which the basis stays
+    optimal (objective) or feasible (rhs). Return {} if basis is not a
+    basis. Uses dense matrices, so it is meant for small and medium LPs.
+    """
+    n, m = p.numcols, p.numrows
+    obj = np.asarray(obj, dtype=float)
+    x = np.asarray(x, dtype=float)
+    sigma = 1.0 if p.maximize else -1.0
+
+    # variables z = [x, s] with [A I] z = rhs
+    M = np.zeros((m, n + m))
+    i, j, v = p.A.to_arrays()
+    M[(i, j)] = v
+    M[:, n:] = np.eye(m)
+    lb, ub = slackBounds(p)
+    lb = np.concatenate([p.lb, lb])
+    ub = np.concatenate([p.ub, ub])
+    cz = np.concatenate([obj, np.zeros((m,))])
+    z = np.concatenate([x, p.rhs - M[:, :n].dot(x)])
+
+    basic = np.concatenate([basis['cstat'], basis['rstat']]) == BASIC
+    if basic.sum() != m:
+        return {}
+    try:
+        Binv = np.linalg.inv(M[:, basic])
+    except np.linalg.LinAlgError:
+        return {}
+    y = Binv.T.dot(cz[basic])
+    d = cz - M.T.dot(y)
+    d[basic] = 0.0
+
+    # nonbasic variables: at lower or upper bound, free, or fixed
+    nonbasic = np.nonzero(~basic)[0]
+    fixed = lb[nonbasic] == ub[nonbasic]
+    free = np.isinf(lb[nonbasic]) & np.isinf(ub[nonbasic])
+    # at the nearer bound
+    lower = np.abs(z[nonbasic] - lb[nonbasic]) <= np.abs(z[nonbasic] - ub[nonbasic])
+    atlower = ~fixed & ~free & lower
+    atupper = ~fixed & ~free & ~lower
+
+    # objective ranging, nonbasic columns: reduced cost keeps its sign
+    olower = np.empty((n + m,))
+    oupper = np.empty((n + m,))
+    olower[:] = -np.Inf
+    oupper[:] = np.Inf
+    g = sigma * d[nonbasic]
+    c = cz[nonbasic]
+    limit = c - d[nonbasic]
+    olower[nonbasic] = np.where(atlower & (sigma < 0) | atupper & (sigma > 0), limit, -np.Inf)
+    oupper[nonbasic] = np.where(atlower & (sigma > 0) | atupper & (sigma < 0), limit, np.Inf)
+    olower[nonbasic[free]] = c[free]
+    oupper[nonbasic[free]] = c[free]
+
+    # basic columns: changing obj[j] by t changes d[k] by -t alpha[r,k]
+    H = sigma * Binv.dot(M[:, nonbasic])
+    H[np.abs(H) <= tol] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = g / H
+    low = ((atlower & (H > 0)) | (atupper & (H < 0)))
+    up = ((atlower & (H < 0)) | (atupper & (H > 0)))
+    tfree = free & (H != 0)
+    tlow = np.where(low, ratio, -np.Inf).max(1)
+    tup = np.where(up, ratio, np.Inf).min(1)
+    blocked = tfree.any(1)
+    tlow = np.where(blocked, 0.0, np.minimum(tlow, 0.0))
+    tup = np.where(blocked, 0.0, np.maximum(tup, 0.0))
+    olower[basic] = cz[basic] + tlow
+    oupper[basic] = cz[basic] + tup
+
+    # rhs ranging: changing rhs[i] by t changes basic z by t Binv[:, i]
+    zb = z[basic]
+    below = np.minimum(lb[basic] - zb, 0.0)[:, None]
+    above = np.maximum(ub[basic] - zb, 0.0)[:, None]
+    Binv[np.abs(Binv) <= tol] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rlow = np.where(Binv > 0, below / Binv, np.where(Binv < 0, above / Binv, -np.Inf))
+        rup = np.where(Binv > 0, above / Binv, np.where(Binv < 0, below / Binv, np.Inf))
+    rhs = np.asarray(p.rhs, dtype=float)
+    rlower = rhs + rlow.max(0) if m > 0 else rhs
+    rupper = rhs + rup.min(0) if m > 0 else rhs
+
+    return {'dual': y, 'reduced cost': d[:n],
+            'obj lower': olower[:n], 'obj upper': oupper[:n],
+            'rhs lower': rlower, 'rhs upper': rupper}
+
+def slackBounds(p):
+    """bounds of row slacks s = rhs - A x"""
+    m = p.numrows
+    sense = np.asarray(p.sense, '|S1')
+    lb = np.zeros((m,))
+    ub = np.zeros((m,))
+    lb[sense == 'G'] = -np.Inf
+    ub[sense == 'L'] = np.Inf
+    if p.rngval is not None:
+        # range rows: rhs <= a x <= rhs + rngval
+        R = sense == 'R'
+        lb[R] = np.minimum(0, -p.rngval[R])
+        ub[R] = np.maximum(0, -p.rngval[R])
+    return lb, ub
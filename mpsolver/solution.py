@@ -0,0 +1,108 @@
+import numpy as np
+
+# keys kept as attributes
+EAGER = ('status', 'objval', 'feasible')
+# keys of the solution dictionaries of earlier versions, fetched before
+# the backend solves again (see Solver._release)
+DETACHED = ('x', 'x primal')
+
+class Solution(object):
+    """Result of a solve, with dictionary-style access
+
+    status, objval and feasible are set when the solution is made. Other
+    values are either given (values) or fetched from the backend on
+    first access with fetchers[key]() ('x', row 'activity', 'dual',
+    'reduced cost', ...). Backends fetch into reusable buffers (see
+    Solver._buffer).
+
+    Values not read yet from the backend are only valid until the solver
+    solves again: then the solver fetches the DETACHED values of its last
+    solution, if that is still in use, and drops the other pending
+    values (see detach). Fetchers with keys in local do not read the
+    backend (e.g., activities computed from x), and are kept.
+
+    Pickling fetches all values (e.g., to return a solution from a
+    worker process).
+    """
+    __slots__ = ('status', 'objval', 'feasible', 'values', 'fetchers', 'local',
+                 '__weakref__')
+
+    def __init__(self, status, objval, feasible, fetchers=None, local=(), **values):
+        self.status = status
+        self.objval = objval
+        self.feasible = feasible
+        self.values = values
+        self.fetchers = fetchers if fetchers is not None else {}
+        self.local = frozenset(local)
+
+    def __getstate__(self):
+        self.detach()
+        for key in list(self.fetchers):
+            self[key]
+        return self.status, self.objval, self.feasible, self.values
+
+    def __setstate__(self, state):
+        self.status, self.objval, self.feasible, self.values = state
+        self.fetchers = {}
+        self.local = frozenset()
+
+    def __getitem__(self, key):
+        if key in EAGER:
+            return getattr(self, key)
+        if key not in self.values:
+            if key not in self.fetchers:
+                raise KeyError(key)
+            self.values[key] = self.fetchers.pop(key)()
+        return self.values[key]
+
+    def __setitem__(self, key, value):
+        if key in EAGER:
+            setattr(self, key, value)
+        else:
+            self.fetchers.pop(key, None)
+            self.values[key] = value
+
+    def __contains__(self, key):
+        return key in EAGER or key in self.values or key in self.fetchers
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return 'Solution(%r)' % (dict(self),)
+
+    def keys(self):
+        return list(EAGER) + list(self.values) + list(self.fetchers)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def update(self, values):
+        for key, value in dict(values).items():
+            self[key] = value
+
+    def detach(self, keys=None):
+        """fetch values keys (default: all pending backend values) and drop
+        the other pending backend values, so that the solution no longer
+        needs the backend (local fetchers are kept)
+        """
+        for key in list(self.fetchers) if keys is None else keys:
+            if key in self.fetchers:
+                self[key]
+        self.fetchers = dict((key, f) for key, f in self.fetchers.items()
+                             if key in self.local)
+
+
+def derived(s, fetchers):
+    """a Solution that reads values from solution s (a Solution or a
+    dictionary) on first access, except for keys in fetchers
+    """
+    values = dict((key, lambda key=key: s[key]) for key in s.keys() if key not in EAGER)
+    values.update(fetchers)
+    return Solution(s['status'], s['objval'], s['feasible'], values)
@@ -1,8 +1,25 @@
+import sys
+import time
+import weakref
 import numpy as N
 
+from asyncsolve import Coalescer, executor, solveMany
+from solution import Solution, DETACHED
+from mpprob import netChanges
+import regret
+
+# basis status codes (same as CPLEX)
+AT_LOWER = 0
+BASIC = 1
+AT_UPPER = 2
+FREE = 3
+
 class Solver(object):
     """Generic mathematic programming problem solver"""
     env = None
+    basiscache = None # a BasisCache shared by solvers (None: no caching)
+    basisdirty = False # basis changed since the last cacheBasis
+    ranging = None # objective ranging of the last solve (see reuse)
 
     def __init__(self, p, name='some solver'):
         """p is a problem instance of type MPProb"""
@@ -10,19 +27,327 @@ class Solver(object):
         self.p = p
         self.p.validate()
         self.nVars = p.numcols
+        self.p.subscribe(self)
+        self.backendrows = p.numrows # rows of p in the backend (see sync)
+        self.backendcols = p.numcols
 
         self.options = {}
+        self.buffers = {} # reusable arrays for solution values
+        self.last = None # weak reference to the last Solution
 
     def __del__(self):
         print 'Deleting solver', self.name
   
     def close(self):
+        if self.basisdirty:
+            self.cacheBasis()
         self.env = None
 
+    def solve_async(self, obj=None):
+        """return an asyncio future of solve(obj)
+        The solve runs on a shared executor, and concurrent requests are
+        micro-batched (see asyncsolve.Coalescer). Set self.coalescer to
+        change the window or the executor
+        """
+        if getattr(self, 'coalescer', None) is None:
+            self.coalescer = Coalescer(lambda objs: solveMany(self, objs), executor())
+        if obj is None:
+            obj = self.p.obj
+        return self.coalescer.submit(obj)
+
+    def pairwiseMaxRegret(self, features, features2=None, workers=1,
+                          processes=False, solverclass=None):
+        """Return the matrix R[a,b] = max over feasible x of
+        (features[a] - features2[b]).x for feature matrices of
+        alternatives (see regret.pairwiseMaxRegret)
+        """
+        return regret.pairwiseMaxRegret(self, features, features2, workers,
+                                        processes, solverclass)
+
+    def memory_usage(self):
+        """Return estimated bytes taken by the solver: {'problem' (see
+        MPProb.memory_usage), 'backend' (the backend copy), 'total'}
+        """
+        problem = self.p.memory_usage()['total']
+        backend = self._backendBytes()
+        return {'problem': problem, 'backend': backend, 'total': problem + backend}
+
+    def _backendBytes(self):
+        # ~ value and index per nonzero, bounds and objective
+        return 16 * self.p.A.nnz() + 40 * (self.p.numrows + self.p.numcols)
+
+    def solveManyRHS(self, rhs_batch, rows=None, stop=False):
+        """solve p for every row of rhs_batch (k x len(rows)) as the rhs
+        of rows (default: all rows), with the rest of p unchanged
+        Each rhs is set with one backend call (see sync) and the
+        backend reoptimizes from the previous basis with the dual simplex
+        (options['method'] = 'dual'); solvers with solveBatch solve all
+        at once. With stop=True, stop at the first infeasible rhs. The rhs
+        of p is restored afterwards.
+        Return stacked 'x' (solved x numcols), 'objval', 'status' and
+        'feasible' arrays for the rhs solved, and the time taken
+        """
+        t = time.time()
+        if rows is None:
+            rows = N.arange(self.p.numrows, dtype=N.int32)
+        rows = N.asarray(rows, dtype=N.int32)
+        rhs_batch = N.asarray(rhs_batch, dtype=float).reshape((-1, len(rows)))
+        if hasattr(self, 'solveBatch'):
+            b = N.tile(self.p.rhs, (len(rhs_batch), 1))
+            b[:, rows] = rhs_batch
+            r = self.solveBatch(rhs_batch=b)
+            solutions = [{'x': r['x'][k], 'objval': r['objval'][k],
+                          'status': r['status'][k], 'feasible': r['feasible'][k]}
+                         for k in range(len(b))]
+        else:
+            solutions = []
+            saved = self.p.rhs[rows].copy()
+            options = dict(self.options)
+            self.options['method'] = 'dual'
+            try:
+                for b in rhs_batch:
+                    self.p.changeRHS(rows, b)
+                    self.sync()
+                    solutions.append(self.solve())
+                    if stop and not solutions[-1]['feasible']:
+                        break
+            finally:
+                self.options = options
+                self.p.changeRHS(rows, saved)
+                self.sync()
+        if stop:
+            infeasible = [k for k, s in enumerate(solutions) if not s['feasible']]
+            if infeasible:
+                solutions = solutions[:infeasible[0] + 1]
+        x = N.array([N.asarray(s['x'], dtype=float) for s in solutions])
+        return {'x': x.reshape((-1, self.p.numcols)),
+                'objval': N.array([s['objval'] for s in solutions], dtype=float),
+                'status': N.array([s['status'] for s in solutions]),
+                'feasible': N.array([s['feasible'] for s in solutions], dtype=bool),
+                'time': time.time() - t}
+
+    def analyze(self, s, obj):
+        """add duals, reduced costs and objective and rhs ranging arrays
+        to solution s for objective obj (see sensitivity.analyze)
+        """
+        from sensitivity import analyze
+        basis = self.getBasis()
+        if basis is not None:
+            s.update(analyze(self.p, obj, s['x'], basis))
+
+    def reuse(self, obj=None):
+        """return the solution for objective obj without a backend call,
+        or None if the last optimal basis may not be optimal for obj
+        Needs options['sensitivity']. The basis stays optimal if the
+        objective change is within the ranging intervals of the last
+        solve by the 100% rule: the fractions of the allowed changes used
+        by the coefficients add up to at most 1.
+        """
+        r = self.ranging
+        if r is None:
+            return None
+        if obj is None:
+            obj = self.p.obj
+        obj = N.asarray(obj, dtype=float)
+        if r['key'] != self.p.fingerprint(obj=False):
+            self.ranging = None
+            return None
+        delta = obj - r['obj']
+        with N.errstate(divide='ignore', invalid='ignore'):
+            allowed = N.where(delta > 0, r['upper'] - r['obj'], r['obj'] - r['lower'])
+            used = N.where(delta != 0, N.abs(delta) / allowed, 0.0)
+        if not used.sum() <= 1:
+            return None
+        x = r['x'].copy()
+        return Solution(r['status'], float(N.dot(obj, x)), True, x=x, reused=True)
+
+    def _sensitivity(self, s, obj):
+        """after a backend solve with objective obj (None: the objective
+        of p), add sensitivity arrays to solution s and keep the ranging
+        for reuse, if options['sensitivity'] is set
+        """
+        self.ranging = None
+        if (not self.options.get('sensitivity') or not s['feasible'] or
+            self.p.probtype != 'LP'):
+            return
+        if obj is None:
+            obj = self.p.obj
+        obj = N.asarray(obj, dtype=float)
+        self.analyze(s, obj)
+        if 'obj lower' in s:
+            self.ranging = {'key': self.p.fingerprint(obj=False), 'obj': obj.copy(),
+                            'lower': s['obj lower'], 'upper': s['obj upper'],
+                            'x': N.array(s['x'], dtype=float), 'status': s['status']}
+
+    def _newSolution(self, status, objval, feasible, fetchers=None, local=(), **values):
+        """return the Solution of a backend solve (see solution.Solution)"""
+        s = Solution(status, objval, feasible, fetchers, local, **values)
+        self.last = weakref.ref(s)
+        return s
+
+    def _release(self):
+        """before the backend solves again: fetch the DETACHED values of
+        the last solution, if it is still in use (see Solution.detach)
+        """
+        s = self.last() if self.last is not None else None
+        if s is not None:
+            s.detach(DETACHED)
+        self.last = None
+
+    def _buffer(self, key, n, dtype=float):
+        """return the reusable array of length n for solution values key,
+        or a new one if the last one is still referenced outside the solver
+        """
+        buf = self.buffers.get(key)
+        # references: self.buffers, buf and the argument of getrefcount
+        if (buf is None or len(buf) != n or buf.dtype != N.dtype(dtype) or
+            sys.getrefcount(buf) > 3):
+            buf = N.empty((n,), dtype=dtype)
+            self.buffers[key] = buf
+        return buf
+
+    def _activity(self, x):
+        """row activities A x"""
+        i, j, v = self.p.A.to_arrays()
+        return N.bincount(i, weights=v * N.asarray(x)[j], minlength=self.p.numrows)
+
+    def getBasis(self):
+        """return current basis {'cstat', 'rstat'}, or None if the solver has none"""
+        return None
+
+    def setBasis(self, basis):
+        pass
+
+    def warmStart(self):
+        """set a cached basis for this problem, if there is one
+        Return True if a basis was set
+        """
+        if self.basiscache is None:
+            return False
+        basis = self.basiscache.get(self.p)
+        if basis is not None:
+            self.setBasis(basis)
+        return basis is not None
+
+    def cacheBasis(self):
+        """store the current basis in the basis cache
+        Solves only mark the basis as changed; it is stored by this call,
+        or on close if it changed since
+        """
+        if self.basiscache is not None:
+            self.basiscache.put(self.p, self.getBasis())
+        self.basisdirty = False
+
+    def checkpoint(self):
+        """return a checkpoint of rows, bounds, rhs, objective and
+        variable types (see rollback)
+        """
+        return {'numrows': self.p.numrows, 'numcols': self.p.numcols,
+                'lb': self.p.lb.copy(), 'ub': self.p.ub.copy(),
+                'rhs': self.p.rhs.copy(), 'obj': self.p.obj.copy(),
+                'ctype': self.p.ctype.copy()}
+
+    def rollback(self, cp):
+        """undo constraints added and bounds, rhs, objective and variable
+        types changed since checkpoint cp
+        Rows removed are not restored (the rhs is then left as it is)
+        """
+        assert self.p.numcols == cp['numcols'], "cannot roll back added columns"
+        p = self.p
+        n = p.numrows - cp['numrows']
+        if n > 0:
+            self.removeLastConstraints(n)
+        changed = N.nonzero((p.lb != cp['lb']) | (p.ub != cp['ub']))[0]
+        if len(changed) > 0:
+            p.changeBounds(changed, cp['lb'][changed], cp['ub'][changed])
+        if p.numrows == cp['numrows']:
+            # e.g., rhs tightened by a merged duplicate (see MPProb.indexRows)
+            rows = N.nonzero(p.rhs != cp['rhs'])[0]
+            if len(rows) > 0:
+                p.changeRHS(rows, cp['rhs'][rows])
+        changed = N.nonzero(p.obj != cp['obj'])[0]
+        if len(changed) > 0:
+            p.changeObjective(cp['obj'][changed], changed)
+        changed = N.nonzero(p.ctype != cp['ctype'])[0]
+        if len(changed) > 0:
+            p.changeVarType(cp['ctype'][changed], changed)
+        self.sync()
+
+    def sync(self):
+        """apply the changes of p since the last sync (see MPProb.changes)
+        to the backend, by their net effect (see mpprob.netChanges): rows
+        removed (_delrows), columns and rows added since, in one block
+        each (_addcols, _addrows), and
+        rhs, bounds, objective and variable types of the rows and columns
+        changed (_chgrhs, _chgbds, _chgobj, _chgctype). Backends sync
+        before they solve
+        """
+        records = self.p.changes(self)
+        if not records:
+            return
+        c = netChanges(records, self.backendrows)
+        if len(c['delete']) > 0:
+            self._delrows(c['delete'])
+        self.backendrows = c['rows']
+        if self.backendcols < self.p.numcols:
+            # before rows, which may have coefficients in new columns
+            self._addcols(self.backendcols)
+            self.backendcols = self.nVars = self.p.numcols
+        if self.backendrows < self.p.numrows:
+            self._addrows(self.backendrows)
+            self.backendrows = self.p.numrows
+        for kind, hook in (('rhs', self._chgrhs), ('bounds', self._chgbds),
+                           ('obj', self._chgobj), ('ctype', self._chgctype)):
+            if len(c[kind]) > 0:
+                hook(c[kind])
+
+    def addConstraint(self, c, update=True):
+        """add general constraint c
+        c is a dictionary with keys {'indices', 'coeffs', 'sense', 'rhs'}
+        The row is added to p, and reaches the backend on the next sync
+        (e.g., solve), in one block with the other rows added since.
+        update is ignored (p is always updated)
+        Return the row that holds c (see MPProb.addConstraint)
+        """
+        return self.p.addConstraint(c)
+
     def addConstraints(self, constraints, update=True):
         for c in constraints:
             self.addConstraint(c,update)
 
+    def addColumns(self, obj, lb=None, ub=None, ctype=None, cols=None):
+        """add new columns (e.g., in column generation)
+        See MPProb.addColumns for arguments.
+        The current basis is kept: new columns enter as non-basic
+        """
+        self.p.addColumns(obj, lb, ub, ctype, cols)
+        self.sync()
+
+    def changeBounds(self, indices, lb=None, ub=None):
+        """change bounds of variables indices (see MPProb.changeBounds)
+        Only the touched columns are updated in the solver, and the
+        current basis is kept for warm starts
+        """
+        self.p.changeBounds(indices, lb, ub)
+        self.sync()
+
+    def removeConstraints(self, rows):
+        """remove constraints rows (row indices, in any order) with one
+        backend call (backends keep the basis of the remaining rows, see
+        _delrows)
+        Return the map from old to new row indices (-1 for removed rows)
+        """
+        index = self.p.removeConstraints(rows)
+        self.sync()
+        return index
+
+    def removeLastConstraint(self):
+        self.removeLastConstraints(1)
+
+    def removeLastConstraints(self, n):
+        """remove n last constraints (see removeConstraints)"""
+        self.removeConstraints(N.arange(self.p.numrows - n, self.p.numrows))
+
     def addComparisonConstraint(self, c):
         """add a comparison constraint between two variables
         c is a dictionary with keys {'index1', 'sense', 'index2'}
@@ -30,10 +355,11 @@ class Solver(object):
         E.g., var[3] >= var[5]
         """
         if c['index1'] != c['index2']:
+            c = dict(c)
             c['indices'] = [c['index1'], c['index2']]
             c['coeffs'] = [1.0, -1.0]
             c['rhs'] = 0.0
-            self.addConstraint(c)
+            return self.addConstraint(c)
 
     def addBoundConstraint(self, c):
         """add a bound constraint on a single parameter
@@ -41,33 +367,118 @@ class Solver(object):
         var[index] {'G','L','E'} val
         E.g., var[3] >= 6
         """
+        c = dict(c)
         c['indices'] = [c['index']]
         c['coeffs'] = [1.0]
         c['rhs'] = c['val']
-        self.addConstraint(c)
+        return self.addConstraint(c)
+
+    def addComparisonConstraints(self, index1, index2, sense):
+        """add comparison constraints var[index1[k]] sense[k] var[index2[k]]
+        in one block (see MPProb.addComparisonConstraints)
+        """
+        self.p.addComparisonConstraints(index1, index2, sense)
+        self.sync()
+
+    def addBoundConstraints(self, index, sense, val, asbounds=False):
+        """add bound constraints var[index[k]] sense[k] val[k] in one block
+        With asbounds=True, variable bounds are tightened instead of
+        adding rows (see MPProb.addBoundConstraints)
+        """
+        self.p.addBoundConstraints(index, sense, val, asbounds)
+        self.sync()
+
+    def _addrows(self, first):
+        """add rows first.. of p to the backend
+        Backends that can add a block of rows at once override this; the
+        default adds the rows one at a time with _addrow
+        """
+        i, j, v = self.p.A.to_arrays()
+        start = N.searchsorted(i, N.arange(first, self.p.numrows + 1))
+        for k, r in enumerate(xrange(first, self.p.numrows)):
+            b, e = start[k], start[k + 1]
+            self._addrow(r, j[b:e], v[b:e])
+
+    def _addrow(self, r, indices, coeffs):
+        """add row r of p, with nonzeros coeffs in columns indices, to the
+        backend (see _addrows)
+        """
+        raise NotImplementedError
+
+    def _delrows(self, rows):
+        """delete rows (sorted indices) from the backend, keeping a valid
+        basis of the remaining rows (see basiscache.fixBasis)
+        """
+        raise NotImplementedError
+
+    def _addcols(self, first):
+        """add columns first.. of p to the backend, with their coefficients
+        in the backend rows (see _colarrays)
+        """
+        raise NotImplementedError
+
+    def _colarrays(self, first):
+        """coefficients of columns first.. of p in rows 0..backendrows-1,
+        as CPLEX-format arrays (matbeg, matcnt, matind, matval)
+        """
+        n = self.p.numcols - first
+        i, j, v = self.p.A.to_arrays()
+        k = (j >= first) & (i < self.backendrows)
+        order = N.argsort(j[k], kind='mergesort') # keeps rows sorted
+        matind, matval = i[k][order], N.asarray(v[k][order], dtype=float)
+        matcnt = N.bincount(j[k] - first, minlength=n).astype(N.int32)
+        matbeg = (N.cumsum(matcnt) - matcnt).astype(N.int32)
+        return matbeg, matcnt, matind, matval
+
+    def _chgrhs(self, rows):
+        """copy rhs of rows from MPProb to the backend"""
+        raise NotImplementedError
+
+    def _chgbds(self, indices):
+        """copy bounds of columns indices from MPProb to the backend"""
+        raise NotImplementedError
+
+    def _chgobj(self, indices):
+        """copy objective coefficients of columns indices from MPProb to the backend"""
+        raise NotImplementedError
+
+    def _chgctype(self, indices):
+        """copy types of columns indices from MPProb to the backend"""
+        raise NotImplementedError
    
     def testConstraint(self, c, obj):
         """Add constraint c, solve, remove constraint"""
-        self.addConstraint(c)
-        s = self.solve(obj)
-        self.removeLastConstraint()
-        return s
+        return self._test(self.addConstraint, c, obj)
     
     def testBoundConstraint(self, c, obj=None):
         """Add constraint c, solve, remove constraint"""
-        self.addBoundConstraint(c)
-        s = self.solve(obj)
-        self.removeLastConstraint()
-        return s
+        return self._test(self.addBoundConstraint, c, obj)
     
     def testComparisonConstraint(self, c, obj=None):
         """Add constraint c, solve, remove constraint"""
-        self.addComparisonConstraint(c)
-        s = self.solve(obj)
-        self.removeLastConstraint()
+        s = self._test(self.addComparisonConstraint, c, obj)
         self.lp.cpx_basis()
         return s
 
+    def _test(self, add, c, obj):
+        """add c with add, solve, and undo the row add returns: remove
+        it if it is new, or restore its rhs if c was merged into it (a
+        duplicate skipped by the row index leaves p unchanged)
+        """
+        first = self.p.numrows
+        index = self.p.rowindex
+        rhs = self.p.rhs.copy() if index is not None and index.merge else None
+        row = add(c)
+        s = self.solve(obj)
+        if row is None:
+            pass
+        elif row >= first:
+            self.removeConstraints([row])
+        elif rhs is not None and self.p.rhs[row] != rhs[row]:
+            self.p.changeRHS([row], rhs[row])
+            self.sync()
+        return s
+
 
 
 # TODO: generalize for non-CPLEX solvers
@@ -80,15 +491,15 @@ class Sampler(Solver):
         p.obj[-1] = 1 # extra variable t
         p.lb[:-1] = p0.lb
         p.ub[:-1] = p0.ub
-        # add identity matrix underneath
-        A = N.vstack([p0.A, N.eye(p0.numcols)])
-        rhs = N.concatenate([p0.rhs, [0] * p0.numcols])
-        sense = N.concatenate([p0.sense, ['E'] * p0.numcols])
-        # add a column of zeros to A
-        A = N.hstack([A, N.zeros((p0.numrows+p0.numcols,1))])
-        p.setA(A)
-        p.setRHS(rhs)
-        p.setSense(sense)
+        # add identity matrix underneath (column t has no coefficients)
+        i, j, v = p0.A.to_arrays()
+        k = N.arange(p0.numcols, dtype=N.int32)
+        p.A.init(p0.numrows + p0.numcols, p.numcols, len(v) + p0.numcols)
+        p.A.put(N.concatenate([i, p0.numrows + k]), N.concatenate([j, k]),
+                N.concatenate([v, N.ones((p0.numcols,))]))
+        p.numrows = p0.numrows + p0.numcols
+        p.setRHS(N.concatenate([p0.rhs, [0] * p0.numcols]))
+        p.setSense(N.concatenate([p0.sense, ['E'] * p0.numcols]))
         
         Solver.__init__(self, p, 'sampler')
         self.p0 = p0
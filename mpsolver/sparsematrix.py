@@ -26,90 +26,233 @@ except:
     MATRIXFORMAT = 'numpy'
 #MATRIXFORMAT = 'numpy'
 
+# Memory budget (bytes) for dense 'numpy' matrices; None means no limit.
+# A dense matrix over the budget is stored in 'coord' format instead
+# (ONBUDGET = 'sparse'), or raises MemoryBudgetError (ONBUDGET = 'fail').
+MEMORYBUDGET = None
+ONBUDGET = 'sparse'
+
+class MemoryBudgetError(MemoryError):
+    pass
+
+def storeformat(n, m, format=None):
+    """format for an n x m matrix, given the memory budget"""
+    if format is None:
+        format = MATRIXFORMAT
+    nbytes = 8 * n * m
+    if format == 'numpy' and MEMORYBUDGET is not None and nbytes > MEMORYBUDGET:
+        if ONBUDGET == 'fail':
+            raise MemoryBudgetError("dense %d x %d matrix needs %d bytes, over "
+                                    "the memory budget of %d bytes" %
+                                    (n, m, nbytes, MEMORYBUDGET))
+        return 'coord'
+    return format
+
 class Matrix(object):
-    """A wrapper for different sparse matrix implementations"""
-    def __init__(self, n=0, m=0, sizeHint=1000):
-        self.init(n,m,sizeHint)
+    """A wrapper for different sparse matrix implementations
+    (formats 'pysparse', 'numpy' (dense) and 'coord', see CoordMatrix)
+    """
+    def __init__(self, n=0, m=0, sizeHint=1000, format=None):
+        self.init(n,m,sizeHint,format)
 
-    def init(self, n, m, sizeHint=1000):
-        if MATRIXFORMAT == 'pysparse':
+    def init(self, n, m, sizeHint=1000, format=None):
+        self.format = storeformat(n, m, format)
+        if self.format == 'pysparse':
             self.matrix = pysparse.spmatrix.ll_mat(n,m,sizeHint)
-        elif MATRIXFORMAT == 'numpy':
+        elif self.format == 'numpy':
             self.matrix = N.zeros((n,m))
+        elif self.format == 'coord':
+            self.matrix = CoordMatrix(n, m)
 
     """Return a list of (i,j,v) triples"""
     def to_coordinate(self):
-        if MATRIXFORMAT == 'pysparse':
+        if self.format == 'pysparse':
             return [(i,j,v) for (i,j),v in self.matrix.items()]
-        elif MATRIXFORMAT == 'numpy':
+        elif self.format == 'numpy':
             def toint(x): return int(x)
             i,j = N.nonzero(self.matrix)
             v = self.matrix[(i,j)]
             return zip(map(toint,i),map(toint,j),v)
+        elif self.format == 'coord':
+            i, j, v = self.matrix.to_arrays()
+            return zip(i.tolist(), j.tolist(), v.tolist())
+
+    def iter_coordinate(self, chunk=65536):
+        """Generate (i,j,v) triples of Python numbers
+        Unlike to_coordinate, only chunk triples exist at a time
+        """
+        i, j, v = self.to_arrays()
+        for k in xrange(0, len(v), chunk):
+            for t in zip(i[k:k+chunk].tolist(), j[k:k+chunk].tolist(),
+                         v[k:k+chunk].tolist()):
+                yield t
+
+    def to_arrays(self):
+        """Return (i, j, v) arrays of nonzeros, sorted by row
+        (for 'coord' matrices, the stored arrays themselves)"""
+        if self.format == 'pysparse':
+            v, i, j = self.matrix.find()
+            order = N.lexsort((j, i))
+            return (N.asarray(i, dtype=N.int32)[order],
+                    N.asarray(j, dtype=N.int32)[order], N.asarray(v)[order])
+        elif self.format == 'numpy':
+            i,j = N.nonzero(self.matrix)
+            return i.astype(N.int32), j.astype(N.int32), self.matrix[(i,j)]
+        elif self.format == 'coord':
+            return self.matrix.to_arrays()
+
+    def put(self, i, j, v):
+        """Set entries (i[k], j[k]) to v[k]"""
+        if self.format == 'pysparse':
+            self.matrix.put(N.asarray(v, dtype=float), N.asarray(i, dtype=int),
+                            N.asarray(j, dtype=int))
+        elif self.format == 'numpy':
+            self.matrix[(i,j)] = v
+        elif self.format == 'coord':
+            self.matrix.put(i, j, v)
 
     def nnz(self):
-        if MATRIXFORMAT == 'pysparse':
+        if self.format == 'pysparse':
             return self.matrix.nnz
+        elif self.format == 'coord':
+            return self.matrix.nnz()
         else:
             return len(self.matrix.nonzero()[0])
 
+    def memory_usage(self):
+        """Return {'format', 'shape', 'nnz', 'bytes'}
+        (bytes are estimated for pysparse)
+        """
+        if self.format == 'pysparse':
+            # value, column index and link per nonzero, row heads
+            nbytes = 16 * self.matrix.nnz + 4 * self.matrix.shape[0]
+        else:
+            nbytes = self.matrix.nbytes
+        return {'format': self.format, 'shape': self.matrix.shape,
+                'nnz': self.nnz(), 'bytes': nbytes}
+
     def add_row(self, row):
-        if MATRIXFORMAT == 'pysparse':
-            # would have to create a new matrix, and copy old+row...
-            raise NotImplementedError, "Adding rows not implemented for pysparse matrices"
-        elif MATRIXFORMAT == 'numpy':
-            self.matrix = N.vstack([self.A, row])
+        self.add_rows(N.atleast_2d(row))
 
     def add_rows(self, rows):
-        if MATRIXFORMAT == 'pysparse':
+        if self.format == 'pysparse':
+            raise NotImplementedError, "Adding rows not implemented for pysparse matrices"
+        elif self.format == 'numpy':
+            self._grow(self.matrix.shape[0] + len(rows), self.matrix.shape[1])
+        if self.format == 'numpy':
+            self.matrix = N.vstack([self.matrix, rows])
+        elif self.format == 'coord':
+            self.matrix.add_rows(rows)
+
+    def add_sparse_rows(self, n, i, j, v):
+        """Append n rows with nonzeros (i[k], j[k]) = v[k]
+        (i counts from the first new row)
+        """
+        if self.format == 'pysparse':
             raise NotImplementedError, "Adding rows not implemented for pysparse matrices"
-        elif MATRIXFORMAT == 'numpy':
+        elif self.format == 'numpy':
+            self._grow(self.matrix.shape[0] + n, self.matrix.shape[1])
+        if self.format == 'numpy':
+            rows = N.zeros((n, self.matrix.shape[1]))
+            rows[(i,j)] = v
             self.matrix = N.vstack([self.matrix, rows])
+        elif self.format == 'coord':
+            self.matrix.add_sparse_rows(n, i, j, v)
+
+    def add_cols(self, cols):
+        """Append a block of columns
+        cols is a dense (numrows x n) array
+        """
+        if self.format == 'pysparse':
+            raise NotImplementedError, "Adding columns not implemented for pysparse matrices"
+        elif self.format == 'numpy':
+            self._grow(self.matrix.shape[0], self.matrix.shape[1] + N.shape(cols)[1])
+        if self.format == 'numpy':
+            self.matrix = N.hstack([self.matrix, cols])
+        elif self.format == 'coord':
+            self.matrix.add_cols(cols)
+
+    def add_sparse_cols(self, n, i, j, v):
+        """Append n columns with nonzeros (i[k], j[k]) = v[k]
+        (j counts from the first new column)
+        """
+        if self.format == 'pysparse':
+            raise NotImplementedError, "Adding columns not implemented for pysparse matrices"
+        elif self.format == 'numpy':
+            self._grow(self.matrix.shape[0], self.matrix.shape[1] + n)
+        if self.format == 'numpy':
+            cols = N.zeros((self.matrix.shape[0], n))
+            cols[(i,j)] = v
+            self.matrix = N.hstack([self.matrix, cols])
+        elif self.format == 'coord':
+            self.matrix.add_sparse_cols(n, i, j, v)
+
+    def compact(self, dtype=float):
+        """Switch to 'coord' format with values of type dtype
+        (float32 values keep ~7 significant digits)
+        """
+        i, j, v = self.to_arrays()
+        self.format = 'coord'
+        self.matrix = CoordMatrix(self.matrix.shape[0], self.matrix.shape[1], dtype)
+        self.matrix.put(i, j, v)
+
+    def _grow(self, n, m):
+        """check the memory budget before a dense matrix grows to n x m,
+        and switch to 'coord' format if it would be exceeded
+        """
+        if storeformat(n, m, 'numpy') == 'coord':
+            self.compact()
 
     def remove_last_rows(self, n):
-        if MATRIXFORMAT == 'pysparse':
+        if self.format == 'pysparse':
             raise NotImplementedError, "Removing rows not implemented for pysparse matrices"
-        elif MATRIXFORMAT == 'numpy':
+        elif self.format == 'numpy':
             self.matrix = self.matrix[:-n,:]
+        elif self.format == 'coord':
+            self.matrix.remove_last_rows(n)
+
+    def remove_rows(self, keep):
+        """Remove rows where the boolean mask keep is False"""
+        if self.format == 'pysparse':
+            raise NotImplementedError, "Removing rows not implemented for pysparse matrices"
+        elif self.format == 'numpy':
+            self.matrix = self.matrix[keep,:]
+        elif self.format == 'coord':
+            self.matrix.remove_rows(keep)
+
+    def copy(self):
+        m = Matrix()
+        m.format = self.format
+        m.matrix = self.matrix.copy()
+        return m
 
     def to_cplex(self):
         """Convert matrix A to CPLEX sparse representation
         Thanks to Stephen Hartke for the code
         """
-
-        nnz = self.nnz()
-        #print "Matrix format: %s, size: %s, num of entries: %d" % (MATRIXFORMAT,
-        #                                                           self.matrix.shape,
-        #                                                           nnz) 
-
         numrows, numcols = self.matrix.shape
+        if self.format in ('numpy', 'coord'):
+            i, j, v = self.to_arrays()
+            order = N.argsort(j, kind='mergesort') # keeps rows sorted
+            matcnt = N.bincount(j, minlength=numcols).astype(N.int32)
+            matbeg = (N.cumsum(matcnt) - matcnt).astype(N.int32)
+            return {'matval': N.asarray(v[order], dtype=float),
+                    'matind': i[order], 'matbeg': matbeg, 'matcnt': matcnt}
 
+        nnz = self.nnz()
         matval = N.empty((nnz,), dtype=float)
         matind = N.empty((nnz,), dtype=N.int32)
         matbeg = N.empty((numcols,), dtype=N.int32)
         matcnt = N.empty((numcols,), dtype=N.int32)
         i = 0
         for col in xrange(0, numcols):
-            if col+1 % 100 == 0: 
-                print col, " ", 
             matbeg[col] = i
             cur_row_count = 0
-
-            if MATRIXFORMAT == 'pysparse':
-                for (row,tmpcol),v in self.matrix[:,col].items():
-                    matval[i] = v
-                    matind[i] = row
-                    i += 1
-                    cur_row_count += 1
-                
-            elif MATRIXFORMAT == 'numpy':
-                for row in xrange(0, numrows):
-                    if self.matrix[row,col] != 0:
-                        matval[i] = self.matrix[row,col]
-                        matind[i] = row
-                        i += 1
-                        cur_row_count += 1
-
+            for (row,tmpcol),v in self.matrix[:,col].items():
+                matval[i] = v
+                matind[i] = row
+                i += 1
+                cur_row_count += 1
             matcnt[col] = cur_row_count
         assert i == self.nnz(), (i, self.nnz())
 
@@ -117,6 +260,9 @@ class Matrix(object):
                 'matbeg':matbeg, 'matcnt':matcnt}
 
     def __getattr__(self, name):
+        if name == 'matrix':
+            # not initialized yet (e.g., while unpickling)
+            raise AttributeError(name)
         return getattr(self.matrix, name)
 
     def __len__(self):
@@ -134,3 +280,157 @@ class Matrix(object):
     def TMP__str__(self):
         return str(self.matrix)
         
+
+
+class CoordMatrix(object):
+    """Sparse n x m matrix in coordinate form: NumPy arrays of row
+    indices i and column indices j (int32) and values v (of type dtype),
+    sorted by row
+    Entries set one at a time are buffered, and merged on the next read.
+    Blocks of rows appended are kept apart, and joined with one
+    concatenation on the next read.
+    """
+    def __init__(self, n, m, dtype=float):
+        self.shape = (n, m)
+        self.i = N.empty((0,), dtype=N.int32)
+        self.j = N.empty((0,), dtype=N.int32)
+        self.v = N.empty((0,), dtype=dtype)
+        self.buffer = [] # (i, j, v) set since the last merge
+        self.blocks = [] # sorted (i, j, v) of rows appended since the last join
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __setitem__(self, key, value):
+        self.buffer.append((key[0], key[1], value))
+        if len(self.buffer) >= 65536:
+            self._merge()
+
+    def __getitem__(self, key):
+        i, j = key
+        self._merge()
+        k = N.nonzero((self.i == i) & (self.j == j))[0]
+        return self.v[k[0]] if len(k) > 0 else 0.0
+
+    def put(self, i, j, v):
+        i = N.asarray(i, dtype=N.int32).ravel()
+        self._merge(i, j, N.zeros((len(i),), dtype=self.v.dtype) + v)
+
+    def to_arrays(self):
+        self._merge()
+        return self.i, self.j, self.v
+
+    def nnz(self):
+        self._merge()
+        return len(self.v)
+
+    @property
+    def nbytes(self):
+        # a buffered entry is a tuple of Python numbers
+        return (sum([i.nbytes + j.nbytes + v.nbytes for i, j, v in self.blocks]) +
+                self.i.nbytes + self.j.nbytes + self.v.nbytes + 100 * len(self.buffer))
+
+    def add_rows(self, rows):
+        rows = N.atleast_2d(N.asarray(rows, dtype=float))
+        i, j = N.nonzero(rows)
+        self.add_sparse_rows(len(rows), i, j, rows[(i,j)])
+
+    def add_sparse_rows(self, n, i, j, v):
+        first = self.shape[0]
+        self.shape = (first + n, self.shape[1])
+        if self.buffer:
+            self._merge(N.asarray(i, dtype=N.int32) + first, j, v)
+            return
+        # the new rows follow all stored entries: only they need sorting
+        block = CoordMatrix(n, self.shape[1], self.v.dtype)
+        block._merge(i, j, v)
+        block.i += N.int32(first)
+        self.blocks.append((block.i, block.j, block.v))
+
+    def _join(self):
+        """append the blocks of rows added to the arrays"""
+        if self.blocks:
+            blocks = [(self.i, self.j, self.v)] + self.blocks
+            self.blocks = []
+            self.i = N.concatenate([b[0] for b in blocks])
+            self.j = N.concatenate([b[1] for b in blocks])
+            self.v = N.concatenate([b[2] for b in blocks])
+
+    def add_cols(self, cols):
+        cols = N.asarray(cols, dtype=float)
+        i, j = N.nonzero(cols)
+        self.add_sparse_cols(cols.shape[1], i, j, cols[(i,j)])
+
+    def add_sparse_cols(self, n, i, j, v):
+        first = self.shape[1]
+        self.shape = (self.shape[0], first + n)
+        self._merge(i, N.asarray(j, dtype=N.int32) + first, v)
+
+    def remove_last_rows(self, n):
+        self._merge()
+        self.shape = (self.shape[0] - n, self.shape[1])
+        keep = self.i < self.shape[0]
+        self.i, self.j, self.v = self.i[keep], self.j[keep], self.v[keep]
+
+    def remove_rows(self, keep):
+        self._merge()
+        index = N.cumsum(keep, dtype=N.int32) - 1
+        k = keep[self.i]
+        self.i, self.j, self.v = index[self.i[k]], self.j[k], self.v[k]
+        self.shape = (int(keep.sum()), self.shape[1])
+
+    def copy(self):
+        self._merge()
+        c = CoordMatrix(self.shape[0], self.shape[1], self.v.dtype)
+        c.i, c.j, c.v = self.i.copy(), self.j.copy(), self.v.copy()
+        return c
+
+    def _merge(self, i=None, j=None, v=None):
+        """merge buffered entries and entries (i, j, v) into the arrays
+        Later entries overwrite earlier ones, and zeros are dropped
+        """
+        self._join()
+        parts = [(self.i, self.j, self.v)]
+        if self.buffer:
+            parts.append(zip(*self.buffer))
+            self.buffer = []
+        if i is not None:
+            parts.append((i, j, v))
+        if len(parts) == 1:
+            return
+        i = N.concatenate([N.asarray(p[0], dtype=N.int32) for p in parts])
+        j = N.concatenate([N.asarray(p[1], dtype=N.int32) for p in parts])
+        v = N.concatenate([N.asarray(p[2], dtype=self.v.dtype) for p in parts])
+        if len(i) > 0 and (i.min() < 0 or i.max() >= self.shape[0] or
+                           j.min() < 0 or j.max() >= self.shape[1]):
+            raise IndexError("index out of bounds for %d x %d matrix" % self.shape)
+        order = N.lexsort((j, i)) # stable
+        i, j, v = i[order], j[order], v[order]
+        last = N.ones((len(i),), dtype=bool)
+        last[:-1] = (i[1:] != i[:-1]) | (j[1:] != j[:-1])
+        keep = last & (v != 0)
+        self.i, self.j, self.v = i[keep], j[keep], v[keep]
+
+
+def column_arrays(cols, numcols):
+    """Normalize sparse column data in CPLEX format
+    cols is a dictionary with keys {'matbeg', 'matind', 'matval'}
+    ('matcnt' is optional), or None for columns without coefficients.
+    Return contiguous (matbeg, matcnt, matind, matval) arrays
+    """
+    if cols is None:
+        return (N.zeros((numcols,), dtype=N.int32), N.zeros((numcols,), dtype=N.int32),
+                N.empty((0,), dtype=N.int32), N.empty((0,), dtype=float))
+    matbeg = N.asarray(cols['matbeg'], dtype=N.int32)
+    matind = N.asarray(cols['matind'], dtype=N.int32)
+    matval = N.asarray(cols['matval'], dtype=float)
+    assert len(matbeg) == numcols
+    assert len(matind) == len(matval)
+    if 'matcnt' not in cols:
+        matcnt = N.diff(N.append(matbeg, len(matind))).astype(N.int32)
+        return matbeg, matcnt, matind, matval
+    # gather entries, since columns may not be stored contiguously
+    matcnt = N.asarray(cols['matcnt'], dtype=N.int32)
+    start = N.cumsum(matcnt) - matcnt
+    pos = N.arange(matcnt.sum()) + N.repeat(matbeg - start, matcnt)
+    return start.astype(N.int32), matcnt, matind[pos], matval[pos]
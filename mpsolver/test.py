@@ -99,8 +99,55 @@ def test1():
     solution = s.solve()
     print "Final solution", solution
 
+    return s
+
+
+def test2():
+    """Column generation: add variable w to the LP from test1
+
+    Minimize
+    obj: x + 4 y + 9 z + 0.5 w
+    Subject To
+    c1: y + x <= 5
+    c2: z + x + w >= 10
+    c3: z - y >= 8
+    Bounds
+    x <= 4
+    -1 <= y <= 1
+    0 <= w <= 10
+
+    Solution: [x = -7, y = -1, z = 7, w = 10], 'objval': 57.0
+    """
+    s = test1()
+
+    # one new column with a single coefficient in row c2 (CPLEX sparse format)
+    cols = {'matbeg': [0], 'matind': [1], 'matval': [1.0]}
+    s.addColumns([0.5], lb=[0], ub=[10], cols=cols)
+    solution = s.solve()
+    print "Solution with column w", solution
+
+
+def test3():
+    """Concurrent async solves of the LP from test1 with the pure NumPy
+    interior point solver, coalesced into micro-batches
+
+    Solutions: 'objval' 62.0 for obj [1,4,9], 63.0 for obj [1,3,9]
+    """
+    from mpsolver.asyncsolve import asyncio
+    from mpsolver.ipmsolver import IPMSolver
+    p = test1().p
+
+    s = IPMSolver(p.copy(), name='test3 solver')
+    loop = asyncio.get_event_loop()
+    futures = [s.solve_async(obj) for obj in ([1,4,9], [1,3,9]) * 4]
+    solutions = loop.run_until_complete(asyncio.gather(*futures))
+    print "Async objvals", [round(sol['objval'], 6) for sol in solutions]
+    print "Async stats", s.coalescer.stats.asdict()
+
 
 if __name__ == "__main__":
 
     test1()
+    test2()
+    test3()
 
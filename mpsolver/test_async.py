@@ -0,0 +1,42 @@
+import unittest
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.pool import SolverPool
+from mpsolver.asyncsolve import asyncio
+from mpsolver.testproblems import test1 as problem
+
+OBJS = [[1, 4, 9], [1, 3, 9]] # optima 62 and 63
+
+def run(futures):
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(asyncio.gather(*futures))
+
+
+class TestAsync(unittest.TestCase):
+    def test_solve_async(self):
+        s = IPMSolver(problem())
+        solutions = run([s.solve_async(obj) for obj in OBJS * 4])
+        self.assertEqual([round(r['objval'], 5) for r in solutions], [62.0, 63.0] * 4)
+        stats = s.coalescer.stats.asdict()
+        self.assertEqual(stats['requests'], 8)
+        self.assertEqual(stats['sweeps'], 1)
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['batchsize']['count'], 1)
+        self.assertEqual(stats['latency']['count'], 8)
+
+    def test_pool_submit(self):
+        p = problem()
+        pool = SolverPool(IPMSolver)
+        r1, r2 = run([pool.submit(p, OBJS), pool.submit(p, [OBJS[0]] * 3)])
+        self.assertEqual([round(r['objval'], 5) for r in r1], [62.0, 63.0])
+        self.assertEqual([round(r['objval'], 5) for r in r2], [62.0] * 3)
+        stats = pool.stats()
+        self.assertEqual(stats['async']['requests'], 5)
+        self.assertEqual(stats['async']['sweeps'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['leased'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
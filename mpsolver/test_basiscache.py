@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mpsolver.solver import Solver, AT_LOWER, BASIC
+from mpsolver.basiscache import BasisCache
+from mpsolver.testproblems import lp
+
+class BasisSolver(Solver):
+    """backend with a fixed basis, marked as changed by every solve"""
+    def __del__(self):
+        pass
+
+    def solve(self, obj=None):
+        self.basisdirty = self.basiscache is not None
+
+    def getBasis(self):
+        return {'cstat': [BASIC, AT_LOWER], 'rstat': [AT_LOWER, BASIC]}
+
+    def setBasis(self, basis):
+        self.basis = basis
+
+
+def problem():
+    return lp([[1, 2], [3, 1]], [4, 5], 'L')
+
+
+class TestBasisCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_stored_on_close(self):
+        p = problem()
+        s = BasisSolver(p)
+        s.basiscache = BasisCache(self.path)
+        s.solve()
+        self.assertEqual(s.basiscache.entries, {})
+        s.close()
+        self.assertEqual(len(s.basiscache.entries), 1)
+        self.assertEqual(len(os.listdir(self.path)), 1)
+        self.assertFalse(s.basisdirty)
+
+    def test_load(self):
+        p = problem()
+        s = BasisSolver(p)
+        s.basiscache = BasisCache(self.path)
+        s.cacheBasis()
+        t = BasisSolver(p.copy())
+        t.basiscache = BasisCache(self.path)
+        self.assertTrue(t.warmStart())
+        self.assertEqual(list(t.basis['cstat']), [BASIC, AT_LOWER])
+        self.assertEqual(list(t.basis['rstat']), [AT_LOWER, BASIC])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from mpsolver.branchbound import BranchAndBound
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.testproblems import knapsack
+
+
+class TestBranchAndBound(unittest.TestCase):
+    def check(self, s, p):
+        objval = s.solve()['objval']
+        self.assertAlmostEqual(objval, BranchAndBound(p.copy(), IPMSolver).solve()['objval'], 5)
+        return objval
+
+    def test_changes(self):
+        p = knapsack()
+        s = BranchAndBound(p, IPMSolver)
+        # optima checked by enumeration
+        self.assertAlmostEqual(self.check(s, p), 16.0, 5)
+        p.changeBounds([2], 0.0, 0.0)
+        self.assertAlmostEqual(self.check(s, p), 15.0, 5)
+        p.addConstraint({'indices': [1, 4], 'coeffs': [1.0, 1.0], 'sense': 'L', 'rhs': 1.0})
+        self.check(s, p)
+        p.changeRHS([0], 20.0)
+        self.check(s, p)
+        self.assertEqual(p.journal, [])
+
+    def test_objective(self):
+        s = BranchAndBound(knapsack(), IPMSolver)
+        self.assertAlmostEqual(s.solve([1.0] * 5)['objval'], 2.0, 5)
+        self.assertAlmostEqual(s.solve()['objval'], 16.0, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
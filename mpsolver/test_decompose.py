@@ -0,0 +1,45 @@
+import unittest
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.decompose import DecomposedSolver, split
+from mpsolver.testproblems import lp
+
+def problem():
+    # two blocks: x0 + x1 <= 4 and x2 + x3 <= 6
+    return lp([[1, 1, 0, 0], [0, 0, 1, 1]], [4, 6], 'L', [1, 2, 1, 1], 0, 5)
+
+
+class TestDecomposedSolver(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(len(split(problem())), 2)
+
+    def test_changes(self):
+        p = problem()
+        s = DecomposedSolver(p, IPMSolver, workers=2)
+        self.assertAlmostEqual(s.solve()['objval'], 14.0, 5)
+        s.changeBounds([1], ub=[1.0])
+        p.changeRHS([1], 3.0)
+        p.changeObjective([3.0], [2])
+        self.assertAlmostEqual(s.solve()['objval'], 3 + 2 + 9, 5)
+        self.assertEqual(len(s.blocks), 2)
+        # joins the blocks
+        s.addConstraint({'indices': [0, 2], 'coeffs': [1.0, 1.0], 'sense': 'L', 'rhs': 2.0})
+        r = s.solve()
+        self.assertEqual(len(s.blocks), 1)
+        self.assertAlmostEqual(r['objval'], IPMSolver(p.copy()).solve()['objval'], 5)
+        self.assertEqual(len(p.journal), 0)
+        s.close()
+
+    def test_processes(self):
+        p = problem()
+        s = DecomposedSolver(p, IPMSolver, workers=2, processes=True)
+        r = s.solve()
+        self.assertAlmostEqual(r['objval'], 14.0, 5)
+        self.assertAlmostEqual(r['x'][1], 4.0, 5)
+        p.changeRHS([1], 3.0)
+        self.assertAlmostEqual(s.solve()['objval'], 11.0, 5)
+        s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+try:
+    from scipy.optimize import linprog
+except ImportError:
+    linprog = None
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.testproblems import lp, test1
+
+class TestIPMSolver(unittest.TestCase):
+    def test_lp(self):
+        for sparse in (True, False):
+            s = IPMSolver(test1())
+            s.options['sparse'] = sparse
+            s._build()
+            r = s.solve()
+            self.assertEqual(r['status'], 'opt')
+            self.assertAlmostEqual(r['objval'], 62.0, 5)
+            self.assertTrue(np.allclose(r['x'], [3, -1, 7], atol=1e-6))
+
+    def test_batch(self):
+        r = IPMSolver(test1()).solveBatch([[5, 10, 8], [5, 10, 9], [5, 10, 7]])
+        self.assertTrue(r['feasible'].all())
+        self.assertTrue(np.allclose(r['objval'], [62, 70, 54], atol=1e-5))
+
+    def test_free_and_equality(self):
+        # min x0 + x1 s.t. x0 - x1 = 2, x0 free, x1 >= 0
+        p = lp([[1, -1]], [2], 'E', [1, 1], [-np.Inf, 0], maximize=False)
+        r = IPMSolver(p).solve()
+        self.assertAlmostEqual(r['objval'], 2.0, 5)
+        self.assertTrue(np.allclose(r['x'], [2, 0], atol=1e-6))
+
+    def test_infeasible(self):
+        p = lp([[1, 1], [1, 1]], [1, 3], ['L', 'G'])
+        self.assertEqual(IPMSolver(p).solve()['status'], 'nofeas')
+
+    def test_unbounded(self):
+        p = lp([[1, -1]], [1], 'L', [1, 0])
+        self.assertEqual(IPMSolver(p).solve()['status'], 'unbnd')
+
+    @unittest.skipIf(linprog is None, "needs scipy")
+    def test_random(self):
+        rs = np.random.RandomState(1)
+        for t in range(20):
+            m, n = rs.randint(2, 15, size=2)
+            A = rs.randn(m, n) * (rs.rand(m, n) < 0.5)
+            x0 = rs.randn(n)
+            lb, ub = x0 - 3 * rs.rand(n), x0 + 3 * rs.rand(n)
+            sense = rs.choice(['L', 'G', 'E'], m, p=[0.45, 0.45, 0.1])
+            slack = rs.rand(m) * np.where(sense == 'L', 1, np.where(sense == 'G', -1, 0))
+            p = lp(A, A.dot(x0) + slack, sense, rs.randn(n), lb, ub)
+            sign = np.where(sense == 'G', -1.0, 1.0)[:, None]
+            le = sense != 'E'
+            r = linprog(-p.obj, (sign * A)[le], (sign[:, 0] * p.rhs)[le],
+                        A[~le], p.rhs[~le], zip(lb, ub), method='simplex')
+            self.assertAlmostEqual(IPMSolver(p).solve()['objval'], -r.fun, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
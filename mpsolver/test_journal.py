@@ -0,0 +1,174 @@
+import unittest
+import numpy as np
+
+from mpsolver.mpprob import netChanges
+from mpsolver.solver import Solver
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.scaling import ScaledSolver
+from mpsolver.testproblems import lp
+
+class ListSolver(Solver):
+    """backend that keeps the rhs and nonzeros of its rows in lists
+    (rows are added one at a time, see Solver._addrows)
+    """
+    def __init__(self, p, name='list solver'):
+        Solver.__init__(self, p, name)
+        self.rows = list(p.rhs)
+        self.coeffs = [None] * len(self.rows)
+        self.bounds = set()
+
+    def __del__(self):
+        pass
+
+    def _addrow(self, r, indices, coeffs):
+        self.rows.append(self.p.rhs[r])
+        self.coeffs.append(dict(zip(indices, coeffs)))
+
+    def _delrows(self, rows):
+        for r in rows[::-1]:
+            del self.rows[r]
+            del self.coeffs[r]
+
+    def _chgrhs(self, rows):
+        for r in rows:
+            self.rows[r] = self.p.rhs[r]
+
+    def _chgbds(self, indices):
+        self.bounds.update(indices.tolist())
+
+    def _addcols(self, first):
+        self.cols = self._colarrays(first)
+
+
+def problem(numrows=10, numcols=3):
+    return lp(np.ones((numrows, numcols)), np.arange(numrows), 'L')
+
+def row(rhs):
+    return {'indices': [0, 1], 'coeffs': [1.0, 1.0], 'sense': 'L', 'rhs': rhs}
+
+
+class TestJournal(unittest.TestCase):
+    def test_add_then_remove(self):
+        p = problem()
+        s = ListSolver(p)
+        p.addConstraint(row(10))
+        p.addConstraint(row(11))
+        p.removeConstraints([0])
+        s.sync()
+        self.assertEqual(s.rows, list(p.rhs))
+        self.assertEqual(s.backendrows, p.numrows)
+        self.assertEqual(s.coeffs[-2:], [{0: 1.0, 1: 1.0}] * 2)
+
+    def test_shared_problem(self):
+        p = problem()
+        s1, s2 = ListSolver(p), ListSolver(p)
+        s1.addConstraint(row(10))
+        s1.removeLastConstraint()
+        s2.sync()
+        self.assertEqual(s1.rows, list(p.rhs))
+        self.assertEqual(s2.rows, list(p.rhs))
+        self.assertEqual(s2.backendrows, 10)
+
+    def test_rhs_then_remove(self):
+        p = problem()
+        s = ListSolver(p)
+        p.changeRHS([4], 40.0)
+        p.removeConstraints([0])
+        p.changeRHS([0], 10.0)
+        s.sync()
+        self.assertEqual(s.rows, list(p.rhs))
+
+    def test_net_changes(self):
+        records = [('rows', 3, 2), ('rhs', np.array([1, 4])), ('delete', np.array([0, 3])),
+                   ('bounds', np.array([2, 0])), ('bounds', np.array([2]))]
+        c = netChanges(records, 3)
+        self.assertEqual(c['delete'].tolist(), [0])
+        self.assertEqual(c['rows'], 2)
+        self.assertEqual(c['rhs'].tolist(), [0])
+        self.assertEqual(c['bounds'].tolist(), [0, 2])
+
+    def test_pending_rows(self):
+        p = problem()
+        p.addConstraint(row(10))
+        self.assertEqual(len(p.pending), 1)
+        self.assertEqual(p.A.shape, (11, 3))
+        self.assertEqual(len(p.pending), 0)
+        p.validate()
+
+    def test_pending_buffers(self):
+        p = problem(numrows=1)
+        indices, coeffs = np.array([0, 2]), np.zeros(2)
+        for k in range(3):
+            coeffs[:] = [k + 1, -1]
+            p.addConstraint({'indices': indices, 'coeffs': coeffs, 'sense': 'L', 'rhs': 0.0})
+        i, j, v = p.A.to_arrays()
+        self.assertEqual(v[(i > 0) & (j == 0)].tolist(), [1, 2, 3])
+
+    def test_extend_chunks(self):
+        rows = [([k % 3, (k + 1) % 3], [1.0, float(k)], 'L', float(k)) for k in range(10)]
+        p, q = problem(numrows=1), problem(numrows=1)
+        p.extend(rows, chunk_size=3)
+        for c in rows:
+            q.addConstraint(dict(zip(('indices', 'coeffs', 'sense', 'rhs'), c)))
+        # chunks are joined on the first read
+        self.assertEqual(len(p.A.matrix.blocks), 4)
+        self.assertEqual(len(p.appended), 4)
+        for a, b in zip(p.A.to_arrays(), q.A.to_arrays()):
+            self.assertEqual(a.tolist(), b.tolist())
+        self.assertEqual(p.rhs.tolist(), q.rhs.tolist())
+        self.assertEqual(p.sense.tolist(), q.sense.tolist())
+        self.assertEqual(p.appended, [])
+        p.validate()
+
+    def test_journal_trimmed(self):
+        p = problem()
+        s1, s2 = ListSolver(p), ListSolver(p)
+        p.changeBounds([1], 0.0, 1.0)
+        s1.sync()
+        self.assertEqual(len(p.journal), 1)
+        s2.sync()
+        self.assertEqual(len(p.journal), 0)
+        self.assertEqual(s2.bounds, set([1]))
+
+    def test_solve_after_changes(self):
+        p = problem(numrows=4)
+        p.obj[:] = [1.0, 2.0, 3.0]
+        s = IPMSolver(p)
+        s.solve()
+        s.addConstraint({'indices': [2], 'coeffs': [1.0], 'sense': 'L', 'rhs': 0.5})
+        p.changeRHS([1], 5.0)
+        s.removeConstraints([0])
+        s.changeBounds([1], ub=[0.25])
+        objval = s.solve()['objval']
+        q = p.copy()
+        self.assertAlmostEqual(objval, IPMSolver(q).solve()['objval'], 5)
+        # sum of x <= 2 (row 2), x2 <= 0.5, x1 <= 0.25
+        self.assertAlmostEqual(objval, 1.25 + 2 * 0.25 + 3 * 0.5, 5)
+
+    def test_add_columns(self):
+        p = problem(numrows=3)
+        p.obj[:] = [1.0, 2.0, 3.0]
+        p.setRHS([2.0, 3.0, 4.0])
+        s1, s2, s3 = IPMSolver(p), ScaledSolver(p, IPMSolver), ListSolver(p)
+        s1.solve()
+        s1.addColumns([4.0], lb=[0.0], ub=[1.0],
+                      cols={'matbeg': [0], 'matind': [0, 2], 'matval': [1.0, 1.0]})
+        self.assertEqual(p.A.shape, (3, 4))
+        for s in (s1, s2):
+            self.assertAlmostEqual(s.solve()['objval'], 3 * 1.0 + 4 * 1.0, 5)
+        s3.sync()
+        self.assertEqual(s3.cols[2].tolist(), [0, 2])
+        self.assertEqual(s3.backendcols, 4)
+
+    def test_add_sparse_columns(self):
+        p = problem(numrows=3)
+        p.compact()
+        p.addColumns([0.0, 0.0], cols={'matbeg': [0, 1], 'matind': [1, 2], 'matval': [5.0, 6.0]})
+        self.assertEqual(p.A.format, 'coord')
+        self.assertEqual(p.A.shape, (3, 5))
+        i, j, v = p.A.to_arrays()
+        self.assertEqual(zip(i[j >= 3], j[j >= 3], v[j >= 3]), [(1, 3, 5.0), (2, 4, 6.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
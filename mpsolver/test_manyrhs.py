@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+
+from mpsolver.solver import Solver
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.scaling import ScaledSolver
+from mpsolver.testproblems import lp, test1
+
+class SequentialSolver(Solver):
+    """solver without solveBatch: solveManyRHS solves one rhs at a time
+    (an interior point solver of the same problem does the work)
+    """
+    def __init__(self, p, name='sequential solver'):
+        Solver.__init__(self, p, name)
+        self.solver = IPMSolver(p)
+        self.solves = 0
+
+    def __del__(self):
+        pass
+
+    def solve(self, obj=None):
+        self.sync()
+        self.solves += 1
+        return self.solver.solve(obj)
+
+    def _chgrhs(self, rows):
+        pass
+
+
+def box():
+    # min x0 + x1 s.t. x0 + x1 >= b, 0 <= x <= 1: objval b for b <= 2
+    return lp([[1, 1]], [1], 'G', [1, 1], 0, 1, maximize=False)
+
+
+class TestSolveManyRHS(unittest.TestCase):
+    def test_rows(self):
+        for solverclass in (IPMSolver, SequentialSolver):
+            p = test1()
+            s = solverclass(p)
+            r = s.solveManyRHS([[8], [9], [7]], rows=[2])
+            self.assertTrue(r['feasible'].all())
+            self.assertTrue(np.allclose(r['objval'], [62, 70, 54], atol=1e-5))
+            self.assertTrue(np.allclose(r['x'][1], [2, -1, 8], atol=1e-5))
+            self.assertEqual(p.rhs.tolist(), [5, 10, 8])
+        self.assertEqual(s.solves, 3)
+        self.assertFalse('method' in s.options)
+
+    def test_all_rows(self):
+        r = ScaledSolver(test1(), IPMSolver).solveManyRHS([[5, 10, 8], [5, 10, 9]])
+        self.assertTrue(np.allclose(r['objval'], [62, 70], atol=1e-5))
+
+    def test_stop(self):
+        for solverclass in (IPMSolver, SequentialSolver):
+            p = box()
+            r = solverclass(p).solveManyRHS([0.5, 1.5, 3, 1], stop=True)
+            self.assertEqual(r['feasible'].tolist(), [True, True, False])
+            self.assertTrue(np.allclose(r['objval'][:2], [0.5, 1.5], atol=1e-6))
+            self.assertEqual(p.rhs.tolist(), [1])
+            r = solverclass(p).solveManyRHS([0.5, 3, 1])
+            self.assertEqual(r['feasible'].tolist(), [True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.pool import SolverPool
+from mpsolver.testproblems import test1 as problem
+
+
+class TestPool(unittest.TestCase):
+    def test_rollback(self):
+        p = problem()
+        pool = SolverPool(IPMSolver)
+        with pool.leased(p) as s:
+            s.p.changeRHS([1], 11.0)
+            s.p.changeObjective([2.0], [0])
+            s.addConstraint({'indices': [2], 'coeffs': [1.0], 'sense': 'G', 'rhs': 9.0})
+            s.changeBounds([1], ub=[0.0])
+            s.solve()
+        with pool.leased(p) as s:
+            self.assertAlmostEqual(s.solve()['objval'], 62.0, 5)
+        self.assertEqual(pool.stats()['hits'], 1)
+
+    def test_discard_changed(self):
+        p = problem()
+        pool = SolverPool(IPMSolver)
+        with pool.leased(p) as s:
+            s.removeConstraints([0])
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['idle'], 0)
+        with pool.leased(p) as s:
+            self.assertAlmostEqual(s.solve()['objval'], 62.0, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.presolve import tightenbounds, activitybounds, rowlimits
+from mpsolver.testproblems import lp
+
+class TestTightenBounds(unittest.TestCase):
+    def test_bounds(self):
+        # x0 + x1 <= 4, x0 - x1 >= 1, x1 >= 0.5, x2 = x0 + x1, x0 >= 0
+        p = lp([[1, 1, 0], [1, -1, 0], [0, 1, 0], [-1, -1, 1]], [4, 1, 0.5, 0],
+               ['L', 'G', 'G', 'E'], [1, 1, 0], [0, -np.Inf, -np.Inf])
+        s = IPMSolver(p)
+        objval = s.solve()['objval']
+        lb, ub, stats = tightenbounds(p)
+        self.assertFalse(stats['infeasible'])
+        self.assertTrue(np.allclose(lb, [1.5, 0.5, 2]))
+        self.assertTrue(np.allclose(ub, [3.5, 2.5, 6]))
+        self.assertEqual(stats['columns'].tolist(), [0, 1, 2])
+        self.assertTrue(np.allclose(p.ub, ub))
+        # solvers pick up the new bounds
+        self.assertAlmostEqual(s.solve()['objval'], objval, 5)
+        amin, amax = activitybounds(p)
+        self.assertTrue(np.allclose(amin, [2, -1, 0.5, -4]))
+        self.assertTrue(np.allclose(amax, [6, 3, 2.5, 4]))
+
+    def test_integer(self):
+        p = lp([[2, 3]], [7], 'L')
+        p.ctype[:] = 'I'
+        lb, ub, stats = tightenbounds(p, inplace=False)
+        self.assertEqual(ub.tolist(), [3, 2])
+        self.assertTrue(np.isinf(p.ub).all())
+
+    def test_infeasible(self):
+        p = lp([[1, 1], [1, 0]], [10, 3], ['G', 'L'], None, 0, 5)
+        lb, ub, stats = tightenbounds(p)
+        self.assertTrue(stats['infeasible'])
+        self.assertEqual(p.ub.tolist(), [5, 5])
+
+    def test_random(self):
+        # tightening keeps the optimum, and optimal solutions within bounds
+        rs = np.random.RandomState(1)
+        m, n = 60, 40
+        A = rs.rand(m, n) * (rs.rand(m, n) < 0.1)
+        p = lp(A, rs.rand(m) * 10 + 1, 'L', rs.rand(n))
+        r = IPMSolver(p.copy()).solve()
+        lb, ub, stats = tightenbounds(p)
+        self.assertTrue(stats['tightened'] > 0)
+        self.assertTrue((r['x'] <= ub + 1e-6).all() and (r['x'] >= lb - 1e-6).all())
+        self.assertAlmostEqual(IPMSolver(p).solve()['objval'], r['objval'], 5)
+
+    def test_rowlimits(self):
+        p = lp([[1, 0], [0, 1], [1, 1], [1, -1]], [1, 2, 3, 4], ['L', 'G', 'E', 'R'])
+        p.rngval = np.array([0, 0, 0, -2.0])
+        L, U = rowlimits(p)
+        self.assertEqual(L.tolist(), [-np.Inf, 2, 3, 2])
+        self.assertEqual(U.tolist(), [1, np.Inf, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
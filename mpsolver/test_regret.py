@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.regret import directions, pairwiseMaxRegret
+from mpsolver.testproblems import lp
+
+def simplex(n):
+    # weights w >= 0 with sum 1: the max regret of a over b is max(F[a] - F[b])
+    return lp(np.ones((1, n)), [1], 'E', None, 0, 1)
+
+FEATURES = np.array([[0, 1, 2, 0], [2, 0, 1, 1], [2, 0, 1, 1], [1, 1, 1, 1],
+                     [2, 2, 2, 2], [0, 2, 0, 1], [1, 0, 0, 2]], dtype=float)
+
+def maxdiff(F1, F2):
+    return (F1[:, None, :] - F2[None, :, :]).max(2)
+
+
+class TestRegret(unittest.TestCase):
+    def test_directions(self):
+        F = np.array([[0, 0], [1, 2], [2, 4], [1, 2]], dtype=float)
+        dirs, scale, index = directions(F)
+        self.assertEqual(index[1, 3], -1)
+        # positive multiples share a direction, negative ones do not
+        self.assertEqual(index[1, 0], index[2, 0])
+        self.assertEqual(index[1, 0], index[2, 1])
+        self.assertNotEqual(index[1, 0], index[0, 1])
+        self.assertEqual((scale[1, 0], scale[2, 0]), (2, 4))
+        d = F[:, None, :] - F[None, :, :]
+        pairs = index >= 0
+        self.assertTrue(np.allclose(scale[pairs][:, None] * dirs[index[pairs]], d[pairs]))
+        self.assertEqual(len(dirs), 2)
+
+    def test_regret(self):
+        ref = maxdiff(FEATURES, FEATURES)
+        s = IPMSolver(simplex(4))
+        self.assertTrue(np.allclose(s.pairwiseMaxRegret(FEATURES), ref, atol=1e-6))
+        self.assertTrue(np.allclose(pairwiseMaxRegret(s, FEATURES, workers=3), ref, atol=1e-6))
+        self.assertTrue(np.allclose(pairwiseMaxRegret(IPMSolver(simplex(4)), FEATURES, workers=2,
+                                                      processes=True), ref, atol=1e-6))
+
+    def test_minimize(self):
+        p = simplex(4)
+        p.maximize = False
+        R = pairwiseMaxRegret(IPMSolver(p), FEATURES, FEATURES[:3])
+        self.assertTrue(np.allclose(R, maxdiff(FEATURES, FEATURES[:3]), atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.pool import SolverPool
+from mpsolver.testproblems import lp
+
+def problem(merge=False):
+    # max x0 + x1 + x2 with x0 + x1 <= 4 (c1), x1 + x2 <= 6 (c2), x2 <= 3 (c3)
+    p = lp([[1, 1, 0], [0, 1, 1], [0, 0, 1]], [4, 6, 3], 'L', 1.0)
+    p.indexRows(merge)
+    return p
+
+def c1(rhs):
+    return {'indices': [1, 0], 'coeffs': [2.0, 2.0], 'sense': 'L', 'rhs': 2 * rhs}
+
+
+class TestRowIndex(unittest.TestCase):
+    def test_row_ids(self):
+        p = problem()
+        self.assertEqual(p.addConstraint(c1(5)), 0) # looser duplicate
+        self.assertEqual(p.addConstraint(c1(3)), 3) # tighter: added
+        self.assertEqual(p.addSparseRows([0, 1], [2, 2], [1.0, 1.0], 'L', [3, 1]).tolist(), [2, 4])
+        self.assertEqual(p.numrows, 5)
+        self.assertEqual(p.A.to_arrays()[1][-1], 2)
+
+    def test_skipped_duplicate(self):
+        p = problem()
+        s = IPMSolver(p)
+        self.assertAlmostEqual(s.testConstraint(c1(5), None)['objval'], 7.0, 5)
+        self.assertEqual(p.numrows, 3)
+        self.assertEqual(p.rhs.tolist(), [4, 6, 3])
+        self.assertAlmostEqual(s.solve()['objval'], 7.0, 5)
+
+    def test_merged_duplicate(self):
+        p = problem(merge=True)
+        s = IPMSolver(p)
+        self.assertAlmostEqual(s.testConstraint(c1(2), None)['objval'], 5.0, 5)
+        self.assertEqual(p.numrows, 3)
+        self.assertEqual(p.rhs.tolist(), [4, 6, 3])
+        self.assertAlmostEqual(s.solve()['objval'], 7.0, 5)
+
+    def test_rhs_restored(self):
+        p = problem(merge=True)
+        s = IPMSolver(p)
+        s.testConstraint(c1(2), None)
+        self.assertEqual(s.addConstraint(c1(2)), 0)
+        self.assertEqual(p.rhs[0], 2)
+        self.assertAlmostEqual(s.solve()['objval'], 5.0, 5)
+
+    def test_changed_rhs(self):
+        p = problem()
+        p.changeRHS([0], 10.0)
+        self.assertEqual(p.addConstraint(c1(5)), 3)
+        self.assertAlmostEqual(IPMSolver(p).solve()['objval'], 8.0, 5)
+
+    def test_pool_merge_twice(self):
+        p = problem(merge=True)
+        pool = SolverPool(IPMSolver)
+        for k in range(2):
+            with pool.leased(p) as s:
+                s.addConstraint(c1(2))
+                self.assertAlmostEqual(s.solve()['objval'], 5.0, 5)
+        self.assertEqual(p.rhs.tolist(), [4, 6, 3])
+
+    def test_pool_merge(self):
+        p = problem(merge=True)
+        pool = SolverPool(IPMSolver)
+        with pool.leased(p) as s:
+            s.addConstraint(c1(2))
+            self.assertAlmostEqual(s.solve()['objval'], 5.0, 5)
+        with pool.leased(p) as s:
+            self.assertAlmostEqual(s.solve()['objval'], 7.0, 5)
+        self.assertEqual(pool.stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.scaling import ScaledSolver, scalefactors, scaleratio, scaled
+from mpsolver.testproblems import lp
+
+def problem():
+    # test1 with row 1 times 1e4 and column 2 times 1e-3
+    A = np.array([[1, 1, 0], [1e4, 0, 1e1], [0, -1, 1e-3]])
+    return lp(A, [5, 1e5, 8], ['L', 'G', 'G'], [1, 4, 9e-3],
+              [-np.Inf, -1, -np.Inf], [4, 1, np.Inf], maximize=False)
+
+
+class TestScaling(unittest.TestCase):
+    def test_factors(self):
+        p = problem()
+        i, j, v = p.A.to_arrays()
+        for method in ('geometric', 'equilibrium'):
+            r, c = scalefactors(p, method)
+            self.assertTrue(scaleratio(v * r[i] * c[j]) < scaleratio(v) / 100)
+            self.assertTrue((np.log2(np.concatenate([r, c])) % 1 == 0).all())
+        r, c = scalefactors(p, 'equilibrium', pow2=False)
+        big = np.zeros((p.numrows,))
+        np.maximum.at(big, i, np.abs(v * r[i] * c[j]))
+        self.assertTrue(np.allclose(big, 1))
+
+    def test_solve(self):
+        p = problem()
+        s = ScaledSolver(p, IPMSolver)
+        r = s.solve()
+        self.assertAlmostEqual(r['objval'], 62.0, 5)
+        self.assertTrue(np.allclose(r['x'], [3, -1, 7e3], atol=1e-5))
+        u = IPMSolver(p.copy()).solve()
+        self.assertTrue(np.allclose(r['y'], u['y'], atol=1e-6))
+        self.assertTrue(np.allclose(r['activity'], u['activity'], atol=1e-5))
+        self.assertAlmostEqual(s.solve([1, 4, 0.01])['objval'], IPMSolver(p.copy()).solve([1, 4, 0.01])['objval'], 5)
+
+    def test_rows_with_index(self):
+        p = problem()
+        p.indexRows()
+        s = ScaledSolver(p, IPMSolver)
+        self.assertEqual(s.solver.p.rowindex, None)
+        s.addConstraint({'indices': [0, 1], 'coeffs': [2.0, 2.0], 'sense': 'L', 'rhs': 12.0})
+        s.addConstraint({'indices': [0, 1], 'coeffs': [2.0, 2.0], 'sense': 'L', 'rhs': 6.0})
+        r = s.solve()
+        self.assertEqual(p.numrows, 4)
+        self.assertEqual((len(s.r), s.solver.p.numrows), (4, 4))
+        self.assertAlmostEqual(r['objval'], IPMSolver(p.copy()).solve()['objval'], 5)
+
+    def test_scaled_copy(self):
+        p = problem()
+        r, c = np.array([1.0, 2.0 ** -13, 2.0]), np.array([1.0, 1.0, 2.0 ** 10])
+        q = scaled(p, r, c)
+        self.assertTrue(np.allclose(q.lb * c, p.lb) and np.allclose(q.obj / c, p.obj))
+        self.assertTrue(np.allclose(q.rhs / r, p.rhs))
+
+
+if __name__ == '__main__':
+    unittest.main()
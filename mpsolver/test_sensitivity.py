@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.solver import AT_LOWER, AT_UPPER, BASIC
+from mpsolver.sensitivity import analyze
+from mpsolver.testproblems import lp
+
+def problem():
+    # max 3 x + 2 y s.t. x + y <= 4, x + 3 y <= 8, 0 <= x <= 3, y >= 0
+    # optimum x = 3 (at its bound), y = 1, objval 11
+    return lp([[1, 1], [1, 3]], [4, 8], 'L', [3, 2], 0, [3, np.Inf])
+
+BASIS = {'cstat': np.array([AT_UPPER, BASIC]), 'rstat': np.array([AT_LOWER, BASIC])}
+
+class VertexSolver(IPMSolver):
+    """interior point solver with the optimal basis of problem(), that
+    reuses solutions while the ranging allows (see Solver.reuse)
+    """
+    def __del__(self):
+        pass
+
+    def getBasis(self):
+        return BASIS
+
+    def solve(self, obj=None):
+        s = self.reuse(obj)
+        if s is None:
+            s = IPMSolver.solve(self, obj)
+            self._sensitivity(s, obj)
+        return s
+
+
+class TestSensitivity(unittest.TestCase):
+    def test_analyze(self):
+        p = problem()
+        r = analyze(p, p.obj, [3.0, 1.0], BASIS)
+        self.assertTrue(np.allclose(r['dual'], [2, 0]))
+        self.assertTrue(np.allclose(r['reduced cost'], [1, 0]))
+        self.assertTrue(np.allclose(r['obj lower'], [2, 0]))
+        self.assertTrue(np.allclose(r['obj upper'], [np.Inf, 3]))
+        self.assertTrue(np.allclose(r['rhs lower'], [3, 6]))
+        self.assertTrue(np.allclose(r['rhs upper'], [4 + 2 / 3.0, np.Inf]))
+
+    def test_not_a_basis(self):
+        p = problem()
+        basis = {'cstat': np.array([BASIC, BASIC]), 'rstat': np.array([BASIC, BASIC])}
+        self.assertEqual(analyze(p, p.obj, [3.0, 1.0], basis), {})
+
+    def test_reuse(self):
+        s = VertexSolver(problem())
+        s.options['sensitivity'] = True
+        self.assertAlmostEqual(s.solve()['objval'], 11.0, 5)
+        # within the ranging of y
+        r = s.solve([3.0, 2.5])
+        self.assertTrue(r['reused'])
+        self.assertAlmostEqual(r['objval'], 11.5, 5)
+        # beyond it
+        self.assertEqual(s.reuse([3.0, 3.5]), None)
+        # each change within its range, but more than 100% together
+        self.assertEqual(s.reuse([2.4, 2.5]), None)
+        self.assertFalse(s.reuse([2.5, 2.25]) is None)
+        # the problem changed
+        s.p.changeRHS([0], 4.5)
+        self.assertEqual(s.reuse([3.0, 2.5]), None)
+        r = s.solve([3.0, 2.5])
+        self.assertFalse('reused' in r)
+        self.assertAlmostEqual(r['objval'], 3 * 3 + 2.5 * 1.5, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
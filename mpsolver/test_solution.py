@@ -0,0 +1,27 @@
+import unittest
+
+from mpsolver.ipmsolver import IPMSolver
+from mpsolver.solution import Solution
+from mpsolver.testproblems import lp
+
+class TestSolution(unittest.TestCase):
+    def test_detach(self):
+        backend = {'x': 1, 'x primal': 2, 'dual': 3}
+        fetchers = dict((key, lambda key=key: backend[key])
+                        for key in ('x', 'x primal', 'dual', 'activity'))
+        s = Solution('opt', 0.0, True, fetchers, ('activity',))
+        s.detach(('x', 'x primal'))
+        self.assertEqual((s['x'], s['x primal']), (1, 2))
+        self.assertTrue('activity' in s)
+        self.assertFalse('dual' in s)
+
+    def test_kept_after_next_solve(self):
+        s = IPMSolver(lp([[1, 1]], [3], 'L', [1, 2]))
+        a = s.solve()
+        s.solve([2.0, 1.0])
+        self.assertAlmostEqual(a['x'][1], 3.0, 5)
+        self.assertAlmostEqual(a['activity'][0], 3.0, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
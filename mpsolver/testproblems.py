@@ -0,0 +1,38 @@
+"""Problems shared by the unittests (test_*.py)"""
+import numpy as np
+
+from mpsolver.mpprob import MPProb
+
+def lp(A, rhs, sense, obj=None, lb=0.0, ub=np.Inf, maximize=True):
+    """problem max (or min) obj x s.t. A x sense rhs, lb <= x <= ub
+    (sense, lb and ub may be single values)
+    """
+    A = np.asarray(A, dtype=float)
+    p = MPProb(0, A.shape[1])
+    p.maximize = maximize
+    if obj is not None:
+        p.obj[:] = obj
+    p.lb[:] = lb
+    p.ub[:] = ub
+    p.setA(A)
+    p.setRHS(np.asarray(rhs, dtype=float))
+    p.setSense(np.resize(np.asarray(sense, '|S1'), len(A)))
+    p.validate()
+    return p
+
+def test1():
+    """min x0 + 4 x1 + 9 x2 s.t. x0 + x1 <= 5, x0 + x2 >= 10,
+    x2 - x1 >= 8, x0 <= 4, -1 <= x1 <= 1 (the LP of test.py test1)
+    Solution: x = [3, -1, 7], objval 62
+    """
+    return lp([[1, 1, 0], [1, 0, 1], [0, -1, 1]], [5, 10, 8], ['L', 'G', 'G'],
+              [1, 4, 9], [-np.Inf, -1, -np.Inf], [4, 1, np.Inf], maximize=False)
+
+def knapsack():
+    """binary max 4 x0 + 7 x1 + 9 x2 + 5 x3 + 8 x4 with two knapsack rows
+    Solution: objval 16 (15 with x2 = 0, 2 items at most)
+    """
+    p = lp([[3, 5, 7, 4, 6], [2, 6, 3, 5, 4]], [12, 11], 'L', [4, 7, 9, 5, 8], 0, 1)
+    p.probtype = 'MILP'
+    p.ctype[:] = 'B'
+    return p